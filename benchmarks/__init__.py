@@ -0,0 +1 @@
+"""Headless benchmarks for the playlist data structures."""
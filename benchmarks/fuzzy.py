@@ -0,0 +1,77 @@
+"""Typo tolerant lookup: symmetric-delete index against a linear scan.
+
+Run from the repository root:
+
+    python -m benchmarks.fuzzy 10000 100000 1000000
+
+Titles are drawn from a Zipf-like vocabulary, so the number of distinct
+words grows much slower than the number of titles, as in real libraries.
+The linear scan compares every word of every title with the query and is
+what a lookup without an index has to do.
+"""
+import random
+import sys
+import time
+
+from dsafy.fuzzy_index import FuzzyIndex, edit_distance, max_typos
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def make_vocabulary(rng, size):
+    return ["".join(rng.choice(LETTERS) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+
+def make_titles(rng, vocabulary, count):
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    words = rng.choices(vocabulary, weights, k=count * 3)
+    return [" ".join(words[i:i + rng.randint(1, 3)]) for i in range(0, count * 3, 3)]
+
+
+def make_typo(rng, word):
+    i = rng.randrange(len(word))
+    kind = rng.randrange(3)
+    if kind == 0:
+        return word[:i] + word[i + 1:]
+    if kind == 1:
+        return word[:i] + rng.choice(LETTERS) + word[i + 1:]
+    return word[:i] + rng.choice(LETTERS) + word[i:]
+
+
+def linear_scan(titles, query):
+    limit = max_typos(query)
+    return [i for i, title in enumerate(titles)
+            if any(edit_distance(query, word, limit) <= limit for word in title.split())]
+
+
+def main(argv=None):
+    sizes = [int(arg) for arg in (argv or sys.argv[1:])] or [10_000, 100_000, 1_000_000]
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(rng, 50_000)
+    print(f"{'titles':>10} {'words':>8} {'build s':>8} {'index ms':>9} {'scan ms':>9} {'speedup':>8}")
+    for count in sizes:
+        titles = make_titles(rng, vocabulary, count)
+        queries = [make_typo(rng, word)
+                   for word in rng.sample([w for t in titles[:1000] for w in t.split() if len(w) >= 5], 5)]
+
+        start = time.perf_counter()
+        index = FuzzyIndex()
+        for i, title in enumerate(titles):
+            index.add(i, i, title)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = [set(index.search(query, limit=count)) for query in queries]
+        indexed = (time.perf_counter() - start) / len(queries)
+
+        start = time.perf_counter()
+        expected = [set(linear_scan(titles, query)) for query in queries]
+        scanned = (time.perf_counter() - start) / len(queries)
+
+        assert found == expected, "index and scan disagree"
+        print(f"{count:>10} {index.word_count:>8} {build:>8.1f} {indexed * 1000:>9.1f} "
+              f"{scanned * 1000:>9.1f} {scanned / indexed:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Time to import the playlist core and each player, in a fresh interpreter.
+
+Run from the repository root:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time dsafy.playlist qwn --runs 10
+
+Each import runs in its own process, so nothing is cached between them;
+the best of --runs is shown together with the heavy modules (GUI, audio,
+imaging, NumPy) that the import pulled in.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["dsafy.playlist", "qwn", "nested", "claude"]
+HEAVY = ["tkinter", "pygame", "PIL", "numpy", "customtkinter"]
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(elapsed, ",".join(heavy))
+"""
+
+
+def measure(module, runs):
+    """(best seconds, heavy modules imported), or (None, error) if it cannot be imported"""
+    best = None
+    heavy = ""
+    for _ in range(runs):
+        done = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+                              cwd=ROOT, capture_output=True, text=True)
+        if done.returncode:
+            return None, done.stderr.strip().splitlines()[-1]
+        elapsed, heavy = done.stdout.split(" ", 1)
+        best = min(best or float("inf"), float(elapsed))
+    return best, heavy.strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--runs", type=int, default=5, help="imports per module, best kept (default 5)")
+    args = parser.parse_args(argv)
+
+    print(f"{'module':<16} {'import ms':>10}  heavy modules loaded")
+    for module in args.modules:
+        best, heavy = measure(module, args.runs)
+        if best is None:
+            print(f"{module:<16} {'failed':>10}  {heavy}")
+        else:
+            print(f"{module:<16} {best * 1000:>10.1f}  {heavy or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Memory used per song by the different playlist layouts.
+
+Run from the repository root:
+
+    python -m benchmarks.memory 100000 500000
+
+Then the same songs listed in several playlists, with the fields kept on
+every playlist entry against one record per song shared by all of them.
+"""
+import sys
+import tracemalloc
+
+from dsafy.array_playlist import ArrayPlaylist
+from dsafy.catalog import Catalog
+from dsafy.playlist import Playlist
+
+# Playlists the shared-catalog comparison lists every song in
+PLAYLISTS = 20
+
+
+# The song node as it was before __slots__: one __dict__ per song
+class DictSongNode:
+    def __init__(self, title, artist, path):
+        self.title = title
+        self.artist = artist
+        self.path = path
+        self.play_count = 0
+        self.prev = None
+        self.next = None
+
+
+class DictPlaylist:
+    def __init__(self):
+        self.head = None
+        self.tail = None
+        self.size = 0
+
+    def add_song(self, title, artist, path):
+        node = DictSongNode(title, artist, path)
+        if not self.head:
+            self.head = self.tail = node
+        else:
+            node.prev = self.tail
+            self.tail.next = node
+            self.tail = node
+        self.size += 1
+
+
+LAYOUTS = [
+    ("dict nodes", DictPlaylist),
+    ("__slots__ nodes", Playlist),
+    ("columnar arrays", ArrayPlaylist),
+]
+
+
+def make_songs(count):
+    artists = [f"Artist {i}" for i in range(max(1, count // 20))]
+    return [(f"Track {i}", artists[i % len(artists)], f"/music/{i:08d}.mp3")
+            for i in range(count)]
+
+
+def measure(factory, songs):
+    """Bytes allocated by the playlist itself, the song strings excluded"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    playlist = factory()
+    for title, artist, path in songs:
+        playlist.add_song(title, artist, path)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used
+
+
+def measure_playlists(songs, shared):
+    """Bytes for PLAYLISTS playlists of songs, with one catalog or one each"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    catalog = Catalog() if shared else None
+    playlists = [Playlist(catalog) for _ in range(PLAYLISTS)]
+    for playlist in playlists:
+        for title, artist, path in songs:
+            playlist.add_song(title, artist, path)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used
+
+
+def main(argv=None):
+    sizes = [int(arg) for arg in (argv or sys.argv[1:])] or [10_000, 100_000, 500_000]
+    print(f"{'songs':>10}  {'layout':<16} {'total MB':>9} {'bytes/song':>11} {'vs dict':>8}")
+    for count in sizes:
+        songs = make_songs(count)
+        baseline = None
+        for name, factory in LAYOUTS:
+            used = measure(factory, songs)
+            baseline = baseline or used
+            print(f"{count:>10}  {name:<16} {used / 2**20:>9.1f} {used / count:>11.1f} "
+                  f"{used / baseline:>7.0%}")
+
+    print(f"\nevery song in {PLAYLISTS} playlists")
+    print(f"{'songs':>10}  {'catalog':<16} {'total MB':>9} {'bytes/entry':>11} {'vs own':>8}")
+    for count in sizes:
+        songs = make_songs(count)
+        baseline = None
+        for name, shared in (("one per playlist", False), ("shared", True)):
+            used = measure_playlists(songs, shared)
+            baseline = baseline or used
+            entries = count * PLAYLISTS
+            print(f"{count:>10}  {name:<16} {used / 2**20:>9.1f} {used / entries:>11.1f} "
+                  f"{used / baseline:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
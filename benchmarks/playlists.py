@@ -0,0 +1,450 @@
+"""Every playlist implementation in the repository, operation by operation.
+
+Run from the repository root:
+
+    python -m benchmarks.playlists 1000 10000 100000 1000000
+    python -m benchmarks.playlists --save before.json
+    python -m benchmarks.playlists --compare before.json
+
+Each implementation is built from the same songs and then timed on the
+same random positions. Times for add, remove and select are per operation;
+build, traverse, shuffle and sort are for the whole list. Peak memory is
+that of building the list (the song tuples are shared and not counted).
+With --compare, results more than --tolerance slower or larger than the
+saved run are listed and the exit status is 1; use --repeat 3 or more on
+both runs so noise is not reported as a regression.
+
+The shared playlist comes from dsafy.playlist; classes that still live in
+the GUI scripts are taken out of them without running them, so no window
+opens and tkinter, pygame and PIL are never imported.
+"""
+import argparse
+import ast
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules a lifted class may import; everything else belongs to the GUI
+SAFE_MODULES = {"dsafy", "random", "operator", "collections", "os", "time", "io", "threading"}
+
+OPERATIONS = ("build", "add", "remove_at", "remove_value", "select",
+              "traverse", "shuffle", "sort")
+
+Song = namedtuple("Song", "title artist path duration")
+
+
+def load_classes(filename, *names):
+    """The named classes of one of the scripts, without running the rest of it"""
+    path = os.path.join(ROOT, filename)
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    body = []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name in names:
+            body.append(node)
+        elif isinstance(node, ast.Import):
+            if all(alias.name.split(".")[0] in SAFE_MODULES for alias in node.names):
+                body.append(node)
+        elif isinstance(node, ast.ImportFrom):
+            if (node.module or "").split(".")[0] in SAFE_MODULES:
+                body.append(node)
+    namespace = {"__name__": os.path.splitext(filename)[0]}
+    exec(compile(ast.Module(body, type_ignores=[]), path, "exec"), namespace)
+    return [namespace[name] for name in names]
+
+
+# --- adapters -----------------------------------------------------------------------
+#
+# One per implementation, each doing an operation the way its own code
+# would. An operation the implementation cannot do is None and shows as "-".
+
+class StandardAdapter:
+    name = "standard"
+    source = "standard doubly oop.py"
+
+    def __init__(self):
+        _, self.LinkedList = load_classes(self.source, "Node", "LinkedList")
+
+    def build(self, songs):
+        self.list = self.LinkedList()
+        for song in songs:
+            self.list.add(song)
+
+    def add(self, song):
+        self.list.add(song)
+
+    def _walk(self, index):
+        node = self.list.root
+        for _ in range(index):
+            node = node.getNext()
+        return node
+
+    def remove_at(self, index):
+        self.list.remove(self._walk(index).getData())
+
+    def remove_value(self, song):
+        self.list.remove(song)
+
+    def select(self, index):
+        wanted = self._walk(index)
+        node, position = self.list.root, 0
+        while node is not wanted:
+            node, position = node.getNext(), position + 1
+        return position
+
+    def traverse(self):
+        node = self.list.root
+        while node:
+            node = node.getNext()
+
+    shuffle = None
+    sort = None
+
+
+class MusicAppAdapter:
+    name = "musicApp"
+    source = "musicApp.py"
+
+    def __init__(self):
+        self.MusicSong, self.DNode = load_classes(self.source, "Song", "DNode")
+
+    def _link(self, songs):
+        self.head = self.tail = None
+        self.size = 0
+        for song in songs:
+            self._append(song)
+
+    def _append(self, song):
+        node = self.DNode(self.MusicSong(song.title, song.artist, song.duration, 0))
+        if self.tail:
+            node.previous = self.tail
+            self.tail.next = node
+        else:
+            self.head = node
+        self.tail = node
+        self.size += 1
+
+    def _unlink(self, node):
+        if node.previous:
+            node.previous.next = node.next
+        else:
+            self.head = node.next
+        if node.next:
+            node.next.previous = node.previous
+        else:
+            self.tail = node.previous
+        self.size -= 1
+
+    def _walk(self, index):
+        node = self.head
+        for _ in range(index):
+            node = node.next
+        return node
+
+    def _songs(self):
+        songs = []
+        node = self.head
+        while node:
+            songs.append(node.song)
+            node = node.next
+        return songs
+
+    def build(self, songs):
+        self._link(songs)
+
+    def add(self, song):
+        self._append(song)
+
+    def remove_at(self, index):
+        self._unlink(self._walk(index))
+
+    def remove_value(self, song):
+        node = self.head
+        while node:
+            if node.song.title == song.title and node.song.artist == song.artist:
+                self._unlink(node)
+                return
+            node = node.next
+
+    def select(self, index):
+        wanted = self._walk(index)
+        node, position = self.head, 0
+        while node is not wanted:
+            node, position = node.next, position + 1
+        return position
+
+    def traverse(self):
+        node = self.head
+        while node:
+            node = node.next
+
+    def _relink(self, songs):
+        self.head = self.tail = None
+        self.size = 0
+        for song in songs:
+            node = self.DNode(song)
+            if self.tail:
+                node.previous = self.tail
+                self.tail.next = node
+            else:
+                self.head = node
+            self.tail = node
+            self.size += 1
+
+    def shuffle(self):
+        songs = self._songs()
+        random.shuffle(songs)
+        self._relink(songs)
+
+    def sort(self):
+        self._relink(sorted(self._songs(), key=lambda song: song.title))
+
+
+class CorePlaylistAdapter:
+    """dsafy.playlist, the Playlist of qwn.py and nested.py"""
+    name = "playlist"
+
+    def __init__(self):
+        from dsafy.playlist import Playlist
+        self.Playlist = Playlist
+
+    def build(self, songs):
+        self.list = self.Playlist()
+        for song in songs:
+            self.list.add_song(song.title, song.artist, song.path, song.duration)
+
+    def add(self, song):
+        self.list.add_song(song.title, song.artist, song.path, song.duration)
+
+    def remove_at(self, index):
+        self.list.pop_node(index)
+
+    def remove_value(self, song):
+        for node in self.list:
+            if node.path == song.path:
+                self.list.remove_node(node)
+                return
+
+    def select(self, index):
+        return self.list.index_of(self.list.node_at(index))
+
+    def traverse(self):
+        for _ in self.list:
+            pass
+
+    def shuffle(self):
+        self.list.shuffle()
+
+    def sort(self):
+        self.list.sort_by("title")
+
+
+class ArrayPlaylistAdapter(CorePlaylistAdapter):
+    """dsafy.array_playlist: the same API over columns instead of node objects"""
+    name = "array"
+
+    def __init__(self):
+        from dsafy.array_playlist import ArrayPlaylist
+        from dsafy.progress import parse_duration
+        self.Playlist = ArrayPlaylist
+        self.parse_duration = parse_duration
+
+    def build(self, songs):
+        self.list = self.Playlist()
+        for song in songs:
+            self.add(song)
+
+    def add(self, song):
+        # Durations are kept in an int array
+        self.list.add_song(song.title, song.artist, song.path, self.parse_duration(song.duration))
+
+
+class ClaudeAdapter:
+    name = "claude"
+    source = "claude.py"
+
+    def __init__(self):
+        self.ClaudeSong, _, self.Playlist = load_classes(self.source, "Song", "Node", "Playlist")
+
+    def _song(self, song):
+        return self.ClaudeSong(song.title, song.artist, song.duration, path=song.path)
+
+    def build(self, songs):
+        self.list = self.Playlist("benchmark")
+        for song in songs:
+            self.list.store(self._song(song))
+
+    def add(self, song):
+        self.list.store(self._song(song))
+
+    def remove_at(self, index):
+        self.list.remove_song(index)
+
+    def remove_value(self, song):
+        for node in self.list:
+            if node.song.path == song.path:
+                self.list.remove_node(node)
+                return
+
+    def select(self, index):
+        # The song list shows playlist.order, which is what selection maps to
+        order = self.list.order
+        return order.index_of(order.node_at(index))
+
+    def traverse(self):
+        node = self.list.head
+        while node:
+            node = node.next
+
+    def shuffle(self):
+        self.list.shuffle()
+
+    def sort(self):
+        # Builds the sorted view the song list then shows
+        self.list.sort("title")
+
+
+ADAPTERS = [StandardAdapter, MusicAppAdapter, CorePlaylistAdapter, ArrayPlaylistAdapter, ClaudeAdapter]
+
+
+# --- measuring ----------------------------------------------------------------------
+
+def make_songs(count, rng):
+    artists = [f"Artist {i}" for i in range(max(1, count // 20))]
+    return [Song(f"Track {rng.random():.12f}", artists[i % len(artists)], f"/music/{i:08d}.mp3",
+                 f"{i % 7}:{i % 60:02}")
+            for i in range(count)]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def timed_each(func, arguments):
+    """Mean seconds of func(argument) over arguments"""
+    start = time.perf_counter()
+    for argument in arguments:
+        func(argument)
+    return (time.perf_counter() - start) / len(arguments)
+
+
+def peak_memory(adapter, songs):
+    tracemalloc.start()
+    adapter.build(songs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def run(adapter, songs, ops, rng):
+    """Seconds per operation, plus the peak bytes of building the list"""
+    result = {"peak_bytes": peak_memory(adapter, songs)}
+    result["build"] = timed(adapter.build, songs)
+    count = len(songs)
+
+    extra = make_songs(ops, rng)
+    positions = [rng.randrange(count) for _ in range(ops)]
+    result["traverse"] = timed(adapter.traverse)
+    # Lists that index lazily do it on the first positional lookup after a
+    # build; that belongs to build, not to the selects timed next
+    adapter.select(count // 2)
+    result["select"] = timed_each(adapter.select, positions)
+    result["add"] = timed_each(adapter.add, extra)
+    result["remove_at"] = timed_each(adapter.remove_at, positions)
+    # Mostly songs still in the list, somewhere in the middle on average
+    victims = rng.sample(songs[:count - ops], ops)
+    result["remove_value"] = timed_each(adapter.remove_value, victims)
+    for name in ("shuffle", "sort"):
+        func = getattr(adapter, name)
+        if func is not None:
+            result[name] = timed(func)
+    return result
+
+
+def format_time(seconds):
+    if seconds is None:
+        return "-"
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.1f}ms"
+    return f"{seconds * 1e6:.1f}us"
+
+
+def print_results(count, results):
+    print(f"\n{count} songs")
+    print(f"{'':<10}" + "".join(f"{op:>13}" for op in OPERATIONS) + f"{'peak MB':>10}")
+    for name, result in results.items():
+        print(f"{name:<10}" + "".join(f"{format_time(result.get(op)):>13}" for op in OPERATIONS)
+              + f"{result['peak_bytes'] / 2**20:>10.1f}")
+
+
+def compare(baseline, current, tolerance):
+    """(key, before, after) for every measure that got worse by more than tolerance"""
+    worse = []
+    for size, results in current.items():
+        for name, result in results.items():
+            before = baseline.get(size, {}).get(name, {})
+            for measure, value in result.items():
+                old = before.get(measure)
+                if old and value > old * (1 + tolerance):
+                    worse.append((f"{name} {measure} @ {size}", old, value))
+    return worse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sizes", nargs="*", type=int, default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--ops", type=int, default=50, help="operations timed per size (default 50)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="runs per size, the best is kept (default 1)")
+    parser.add_argument("--only", help="comma separated implementations: "
+                        + ",".join(adapter.name for adapter in ADAPTERS))
+    parser.add_argument("--save", metavar="JSON", help="write the results to a file")
+    parser.add_argument("--compare", metavar="JSON", help="compare with saved results")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="slowdown allowed by --compare (default 0.25, i.e. 25%%)")
+    args = parser.parse_args(argv)
+
+    wanted = set(args.only.split(",")) if args.only else None
+    adapters = [adapter() for adapter in ADAPTERS if wanted is None or adapter.name in wanted]
+    measured = {}
+    for count in args.sizes:
+        ops = min(args.ops, count // 2)
+        songs = make_songs(count, random.Random(count))
+        results = {}
+        for adapter in adapters:
+            # Same positions and songs for every implementation
+            runs = []
+            for _ in range(args.repeat):
+                runs.append(run(adapter, songs, ops, random.Random(count + 1)))
+                adapter.build([])
+            # Best of the repeats: the least disturbed by everything else running
+            results[adapter.name] = {measure: min(r[measure] for r in runs) for measure in runs[0]}
+        print_results(count, results)
+        measured[str(count)] = results
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(measured, f, indent=1)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            worse = compare(json.load(f), measured, args.tolerance)
+        for key, before, after in worse:
+            print(f"worse: {key}: {before:.6g} -> {after:.6g}")
+        if worse:
+            return 1
+        print(f"\nno regressions beyond {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
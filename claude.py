@@ -1,52 +1,64 @@
 import tkinter as tk
 from tkinter import ttk, filedialog
-import random
-import time
-from PIL import Image, ImageTk  # You would need to install Pillow: pip install Pillow
-import io
+import os
 import threading
+from dsafy.history import PlaylistHistory
+from dsafy.indexed_list import IndexedList, IndexedNode
+from dsafy.lazy import LazyModule
+from dsafy.playback import PlaybackController
+from dsafy.progress import PlaybackClock, format_duration, parse_duration
+from dsafy.scanner import ScannedFile
+from dsafy.sorted_index import SortedIndex
+from dsafy.tags import TagCache, TagReader
+from dsafy.virtual_list import VirtualList
+
+# pygame is imported when the player starts its mixer, not with this module
+pygame = LazyModule("pygame")
+mixer = LazyModule("pygame.mixer")
 
 class Song:
-    def __init__(self, title, artist, duration, playcount=0):
+    __slots__ = ("title", "artist", "duration", "playcount", "path")
+
+    def __init__(self, title, artist, duration, playcount=0, path=None):
         self.title = title
         self.artist = artist
-        self.duration = duration
+        # Whole seconds; "m:ss" strings are parsed once, here
+        self.duration = parse_duration(duration)
         self.playcount = playcount
+        # Songs without a file are only timed, not heard
+        self.path = path
     
     def __str__(self):
-        return f"{self.title} by {self.artist} ({self.duration})"
+        return f"{self.title} by {self.artist} ({format_duration(self.duration)})"
+
 
+class Node(IndexedNode):
+    __slots__ = ("song",)
 
-class Node:
     def __init__(self, song):
+        super().__init__()
         self.song = song
-        self.next = None
-        self.prev = None
 
 
-class Playlist:
+class Playlist(IndexedList):
     def __init__(self, name):
+        super().__init__()
         self.name = name
-        self.head = None
-        self.tail = None
         self.current = None
-        self.size = 0
         self.is_playing = False
+        # What next/previous and the song list follow: the playlist itself
+        # or one of its sorted views
+        self.order = self
+        self._views = {}
     
     def store(self, song):
         """Add a song to the end of the playlist"""
         new_node = Node(song)
+        self.append_node(new_node)
         
-        if self.head is None:
-            self.head = new_node
-            self.tail = new_node
+        if self.current is None:
             self.current = new_node
-        else:
-            new_node.prev = self.tail
-            self.tail.next = new_node
-            self.tail = new_node
         
-        self.size += 1
         return True
     
     def display(self):
@@ -67,6 +79,8 @@ class Playlist:
         
         self.is_playing = True
         self.current.song.playcount += 1
+        # Lets the play count view move the song
+        self.touch(self.current)
         return True
     
     def pause(self):
@@ -82,8 +96,9 @@ class Playlist:
         if self.current is None:
             return False
         
-        if self.current.next:
-            self.current = self.current.next
+        next_node = self.order.node_after(self.current)
+        if next_node:
+            self.current = next_node
             return True
         else:
             return False
@@ -93,8 +108,9 @@ class Playlist:
         if self.current is None:
             return False
         
-        if self.current.prev:
-            self.current = self.current.prev
+        prev_node = self.order.node_before(self.current)
+        if prev_node:
+            self.current = prev_node
             return True
         else:
             return False
@@ -110,107 +126,49 @@ class Playlist:
         if self.size <= 1:
             return False
         
-        # Convert linked list to array for shuffling
-        songs = []
-        current = self.head
-        while current:
-            songs.append(current.song)
-            current = current.next
-            
-        # Remember current song
-        current_song = self.current.song if self.current else None
-        
-        # Shuffle the array
-        random.shuffle(songs)
-        
-        # Rebuild the linked list
-        self.head = None
-        self.tail = None
-        self.current = None
-        self.size = 0
-        
-        # Re-add all songs
-        for song in songs:
-            self.store(song)
-            # If this was the current song, update current pointer
-            if song == current_song:
-                self.current = self.tail
-        
+        # Nodes are relinked in place, so the current song stays current
+        self.shuffle_nodes()
+        self.order = self
         return True
     
     def sort(self, key="title"):
-        """Sort the playlist by a given attribute of Song"""
-        if self.size <= 1:
+        """Order the playlist by a given attribute of Song, or by key=None its own order"""
+        if key is None:
+            self.order = self
+            return True
+        if key not in ("title", "artist", "duration", "playcount"):
             return False
         
-        # Convert to list
-        songs = []
-        current = self.head
-        while current:
-            songs.append(current.song)
-            current = current.next
-        
-        # Remember current song
-        current_song = self.current.song if self.current else None
-        
-        # Sort the list
-        if key == "title":
-            songs.sort(key=lambda song: song.title)
-        elif key == "artist":
-            songs.sort(key=lambda song: song.artist)
-        elif key == "duration":
-            songs.sort(key=lambda song: song.duration)
-        elif key == "playcount":
-            songs.sort(key=lambda song: song.playcount, reverse=True)
-        
-        # Rebuild linked list
-        self.head = None
-        self.tail = None
-        self.current = None
-        self.size = 0
-        
-        # Re-add all songs
-        for song in songs:
-            self.store(song)
-            # If this was the current song, update current pointer
-            if song == current_song:
-                self.current = self.tail
-        
+        self.order = self.sorted_view(key)
         return True
+
+    def sorted_view(self, key):
+        """Songs ordered by key, updated as songs are added, removed and played"""
+        view = self._views.get(key)
+        if view is None:
+            # Most played first, everything else ascending
+            view = self._views[key] = SortedIndex(self, lambda node: getattr(node.song, key),
+                                                  reverse=(key == "playcount"))
+        return view
     
     def remove_song(self, index):
         """Remove a song at the specified index"""
         if index < 0 or index >= self.size:
             return False
         
-        current = self.head
-        for i in range(index):
-            current = current.next
+        current = self.order.node_at(index)
         
         # If it's the current song, move current to next or prev
         if current == self.current:
-            if self.current.next:
-                self.current = self.current.next
-            elif self.current.prev:
-                self.current = self.current.prev
-            else:
-                self.current = None
+            self.current = self.order.node_after(current) or self.order.node_before(current)
         
-        # Update links
-        if current.prev:
-            current.prev.next = current.next
-        else:
-            self.head = current.next
-            
-        if current.next:
-            current.next.prev = current.prev
-        else:
-            self.tail = current.prev
-        
-        self.size -= 1
+        self.remove_node(current)
         return True
 
 class MusicPlayerApp:
+    # How often the position on screen is redrawn while playing
+    PROGRESS_INTERVAL_MS = 500
+
     def __init__(self, root):
         self.root = root
         self.root.title("Music Player")
@@ -225,15 +183,24 @@ class MusicPlayerApp:
         self.playlist.store(Song("Dance Monkey", "Tones and I", "3:29", 0))
         self.playlist.store(Song("Watermelon Sugar", "Harry Styles", "2:54", 0))
         self.playlist.store(Song("Don't Start Now", "Dua Lipa", "3:03", 0))
+        # Every add, remove and shuffle from here on can be taken back
+        self.history = PlaylistHistory(self.playlist)
+        
+        mixer.init()
+        self.SONG_END_EVENT = pygame.USEREVENT + 1
+        mixer.music.set_endevent(self.SONG_END_EVENT)
+        self.playback = PlaybackController(root, self.SONG_END_EVENT, self.track_ended)
+        self.tag_reader = TagReader(TagCache())
+        
+        # The position is read from the mixer (or a clock for songs without
+        # a file) whenever it is drawn; nothing counts seconds
+        self.clock = PlaybackClock()
+        self.loaded = None
+        self.progress_job = None
         
         # Set up the main frames
         self.setup_ui()
         
-        # Progress bar simulation variables
-        self.duration_sec = 0
-        self.current_sec = 0
-        self.progress_running = False
-        
         # Update display
         self.update_song_list()
         self.update_current_song_display()
@@ -266,15 +233,13 @@ class MusicPlayerApp:
         self.song_listbox_frame = tk.Frame(self.middle_frame, bg="#34495e")
         self.song_listbox_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
         
-        self.song_listbox = tk.Listbox(self.song_listbox_frame, bg="#2c3e50", fg="white",
-                                      font=("Arial", 12), selectbackground="#3498db",
-                                      selectforeground="white", activestyle="none")
-        self.song_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        self.scrollbar = ttk.Scrollbar(self.song_listbox_frame, orient=tk.VERTICAL, 
-                                      command=self.song_listbox.yview)
-        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.song_listbox.config(yscrollcommand=self.scrollbar.set)
+        # Builds only the rows on screen and brings its own scrollbar
+        self.song_listbox = VirtualList(self.song_listbox_frame, self.playlist,
+                                        format=lambda node: f"{node.song.title} - {node.song.artist}",
+                                        bg="#2c3e50", fg="white",
+                                        font=("Arial", 12), selectbackground="#3498db",
+                                        selectforeground="white", activestyle="none")
+        self.song_listbox.pack(fill=tk.BOTH, expand=True)
         
         # Button frame for playlist operations
         self.playlist_button_frame = tk.Frame(self.middle_frame, bg="#34495e")
@@ -296,6 +261,14 @@ class MusicPlayerApp:
                                     command=self.sort_menu, bg="#2ecc71", fg="white")
         self.sort_button.pack(side=tk.LEFT, padx=5)
         
+        self.undo_button = tk.Button(self.playlist_button_frame, text="Undo", 
+                                    command=self.undo, bg="#7f8c8d", fg="white")
+        self.undo_button.pack(side=tk.LEFT, padx=5)
+        
+        self.redo_button = tk.Button(self.playlist_button_frame, text="Redo", 
+                                    command=self.redo, bg="#7f8c8d", fg="white")
+        self.redo_button.pack(side=tk.LEFT, padx=5)
+        
         # Set up bottom frame (playback controls)
         self.progress_frame = tk.Frame(self.bottom_frame, bg="#2c3e50")
         self.progress_frame.pack(fill=tk.X, padx=20, pady=(10, 0))
@@ -329,25 +302,12 @@ class MusicPlayerApp:
         
         # Double-click on song to play
         self.song_listbox.bind("<Double-1>", self.play_selected_song)
+        self.root.bind("<Control-z>", self.undo)
+        self.root.bind("<Control-y>", self.redo)
 
     def update_song_list(self):
-        """Update the listbox with current playlist"""
-        self.song_listbox.delete(0, tk.END)
-        
-        songs = self.playlist.display()
-        for song in songs:
-            self.song_listbox.insert(tk.END, f"{song.title} - {song.artist}")
-        
-        # Highlight current song
-        if self.playlist.current:
-            current_index = 0
-            current = self.playlist.head
-            while current:
-                if current == self.playlist.current:
-                    self.song_listbox.itemconfig(current_index, bg="#3498db")
-                    break
-                current_index += 1
-                current = current.next
+        """Highlight the current song; rows follow the playlist's change events"""
+        self.song_listbox.highlight(self.playlist.current, bg="#3498db")
 
     def update_current_song_display(self):
         """Update the top frame with current song info"""
@@ -357,14 +317,10 @@ class MusicPlayerApp:
             self.song_title_label.config(text=current_song.title)
             self.song_artist_label.config(text=current_song.artist)
             
-            # Get duration in seconds for progress bar
-            min_sec = current_song.duration.split(":")
-            self.duration_sec = int(min_sec[0]) * 60 + int(min_sec[1])
-            self.total_time_label.config(text=current_song.duration)
+            self.total_time_label.config(text=format_duration(current_song.duration))
             
             # Reset progress bar
-            self.current_sec = 0
-            self.progress_bar["maximum"] = self.duration_sec
+            self.progress_bar["maximum"] = max(current_song.duration, 1)
             self.progress_bar["value"] = 0
             self.current_time_label.config(text="0:00")
         else:
@@ -390,7 +346,209 @@ class MusicPlayerApp:
             
         self.update_song_list()
 
+    def start_progress(self):
+        """Start or resume the current song and the timer that shows its position"""
+        node = self.playlist.current
+        song = node.song
+        if self.loaded is not node:
+            self.loaded = node
+            if song.path:
+                mixer.music.load(song.path)
+                mixer.music.play()
+                self.clock.start(mixer.music.get_pos)
+            else:
+                mixer.music.stop()
+                self.clock.start()
+        else:
+            if song.path:
+                mixer.music.unpause()
+            self.clock.resume()
+        if song.path:
+            self.playback.playing()
+        if self.progress_job is None:
+            self.show_progress()
+
+    def stop_progress(self):
+        """Pause the current song and the timer that shows its position"""
+        if self.loaded and self.loaded.song.path:
+            mixer.music.pause()
+        self.clock.pause()
+        self.playback.idle()
+        if self.progress_job is not None:
+            self.root.after_cancel(self.progress_job)
+            self.progress_job = None
+
+    def show_progress(self):
+        self.progress_job = None
+        duration = self.loaded.song.duration
+        position = self.clock.position()
+        if not self.loaded.song.path and position >= duration:
+            # Songs without a file end when their time is up
+            self.track_ended()
+            return
+        if duration:
+            position = min(position, duration)
+        self.progress_bar["value"] = position
+        self.current_time_label.config(text=format_duration(position))
+        self.progress_job = self.root.after(self.PROGRESS_INTERVAL_MS, self.show_progress)
+
+    def change_song(self):
+        """Show the new current song and start it if the player is playing"""
+        self.update_current_song_display()
+        self.update_song_list()
+        if self.playlist.is_playing:
+            self.playlist.play()
+            self.start_progress()
+
+    def track_ended(self):
+        if self.loaded and self.loaded.song.path and mixer.music.get_busy():
+            # The end of a track that was replaced before it finished
+            return
+        if self.playlist.next():
+            self.change_song()
+        else:
+            # End of the playlist: stop, ready to start the last song again
+            self.playlist.pause()
+            self.play_button.config(text="▶")
+            self.stop_progress()
+            self.loaded = None
+            self.update_current_song_display()
+            self.update_song_list()
+
     def play_next(self):
         """Play the next song"""
         if self.playlist.next():
-            self.update_current_song_display()
\ No newline at end of file
+            self.change_song()
+
+    def play_previous(self):
+        """Play the previous song"""
+        if self.playlist.previous():
+            self.change_song()
+
+    def play_selected_song(self, event=None):
+        """Play the song double-clicked in the list"""
+        selection = self.song_listbox.curselection()
+        if not selection:
+            return
+        self.playlist.current = self.playlist.order.node_at(selection[0])
+        self.loaded = None
+        if not self.playlist.is_playing:
+            self.playlist.is_playing = True
+            self.play_button.config(text="⏸")
+        self.change_song()
+
+    def add_song(self):
+        """Add audio files; their tags and durations are read off the Tk thread"""
+        paths = filedialog.askopenfilenames(filetypes=[("Audio Files", "*.mp3 *.wav *.ogg *.flac")])
+        if paths:
+            threading.Thread(target=self._read_songs, args=(paths,), daemon=True).start()
+
+    def _read_songs(self, paths):
+        files = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            title = os.path.splitext(os.path.basename(path))[0]
+            files.append(ScannedFile(path, title, "Unknown", stat.st_size, stat.st_mtime))
+        # Durations come from the file headers, read in a worker pool for
+        # larger imports, and are cached with the tags
+        songs = [Song(f.title, f.artist, f.duration, path=f.path) for f in self.tag_reader.resolve(files)]
+        self.playback.call_soon(self._store_songs, songs)
+
+    def _store_songs(self, songs):
+        had_current = self.playlist.current is not None
+        for song in songs:
+            self.playlist.store(song)
+        if not had_current:
+            self.update_current_song_display()
+        self.update_song_list()
+
+    def remove_song(self):
+        """Remove the selected song"""
+        selection = self.song_listbox.curselection()
+        if not selection:
+            return
+        was_current = self.playlist.order.node_at(selection[0]) is self.playlist.current
+        self.playlist.remove_song(selection[0])
+        if was_current:
+            self.loaded = None
+            if self.playlist.current is None:
+                self.playlist.pause()
+                self.play_button.config(text="▶")
+                self.stop_progress()
+                mixer.music.stop()
+                self.update_current_song_display()
+            else:
+                self.change_song()
+        self.update_song_list()
+
+    def shuffle_playlist(self):
+        """Shuffle the playlist and show it in its new order"""
+        if self.playlist.shuffle():
+            self.song_listbox.set_model(self.playlist.order)
+            self.update_song_list()
+
+    def undo(self, event=None):
+        """Take back the last add, remove or shuffle"""
+        self.step_history(self.history.undo)
+
+    def redo(self, event=None):
+        """Make the last undone change again"""
+        self.step_history(self.history.redo)
+
+    def step_history(self, step):
+        """Show another version of the playlist, in its own order"""
+        had_current = self.playlist.current is not None
+        if not step():
+            return
+        if self.playlist.current is None:
+            # The song that was current is not in this version
+            self.playlist.current = self.playlist.head
+            if had_current:
+                self.loaded = None
+                self.playlist.pause()
+                self.play_button.config(text="▶")
+                self.stop_progress()
+                mixer.music.stop()
+            self.update_current_song_display()
+        self.playlist.order = self.playlist
+        self.song_listbox.set_model(self.playlist.order)
+        self.update_song_list()
+
+    def sort_menu(self):
+        """Choose the order the song list is shown and played in"""
+        sort_window = tk.Toplevel(self.root)
+        sort_window.title("Sort Songs")
+        sort_window.configure(bg="#34495e")
+
+        options = [("Playlist order", None), ("Title", "title"), ("Artist", "artist"),
+                   ("Duration", "duration"), ("Most played", "playcount")]
+        var = tk.StringVar(value="Playlist order")
+        for label, _ in options:
+            tk.Radiobutton(sort_window, text=label, variable=var, value=label,
+                           bg="#34495e", fg="white", selectcolor="#2c3e50").pack(anchor=tk.W, padx=20)
+
+        def apply():
+            self.playlist.sort(dict(options)[var.get()])
+            # Views are kept sorted as songs change, so switching is only a redraw
+            self.song_listbox.set_model(self.playlist.order)
+            self.update_song_list()
+            sort_window.destroy()
+
+        tk.Button(sort_window, text="Sort", command=apply, bg="#2ecc71", fg="white").pack(pady=10)
+
+    def on_close(self):
+        self.stop_progress()
+        self.playback.close()
+        self.tag_reader.close()
+        mixer.quit()
+        self.root.destroy()
+
+
+if __name__ == "__main__":
+    root = tk.Tk()
+    app = MusicPlayerApp(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
+    root.mainloop()
@@ -0,0 +1,5 @@
+import sys
+
+from dsafy.cli import main
+
+sys.exit(main())
@@ -0,0 +1,255 @@
+import random
+import sys
+from array import array
+
+from dsafy.indexed_list import ShuffleOrder
+
+# Link value meaning "no song"
+NIL = -1
+
+
+# Lightweight handle to one row of an ArrayPlaylist. It is created on access
+# and only holds (playlist, slot), so it behaves like a SongNode without the
+# library keeping an object per song alive.
+class SongRef:
+    __slots__ = ("playlist", "slot")
+
+    def __init__(self, playlist, slot):
+        self.playlist = playlist
+        self.slot = slot
+
+    def __eq__(self, other):
+        return (isinstance(other, SongRef) and other.playlist is self.playlist
+                and other.slot == self.slot)
+
+    def __hash__(self):
+        return hash((id(self.playlist), self.slot))
+
+    @property
+    def title(self):
+        return self.playlist.titles[self.slot]
+
+    @property
+    def artist(self):
+        return self.playlist.artists[self.slot]
+
+    @property
+    def path(self):
+        return self.playlist.paths[self.slot]
+
+    @property
+    def play_count(self):
+        return self.playlist.play_counts[self.slot]
+
+    @play_count.setter
+    def play_count(self, value):
+        self.playlist.play_counts[self.slot] = value
+
+    @property
+    def duration(self):
+        return self.playlist.durations[self.slot]
+
+    @property
+    def next(self):
+        return self.playlist._ref(self.playlist.next_links[self.slot])
+
+    @property
+    def prev(self):
+        return self.playlist._ref(self.playlist.prev_links[self.slot])
+
+
+# Playlist stored as columns: one list or array per field and integer
+# prev/next links, instead of one Python object per song. Exposes the same
+# API as the linked Playlist in qwn.py and nested.py.
+class ArrayPlaylist:
+    def __init__(self):
+        self.titles = []
+        self.artists = []
+        self.paths = []
+        self.play_counts = array("i")
+        self.durations = array("i")
+        self.prev_links = array("i")
+        self.next_links = array("i")
+        self._head = NIL
+        self._tail = NIL
+        self._current = NIL
+        self.size = 0
+        # Slots of removed songs, reused by the next add
+        self._free = []
+        # Slot at each position and position of each slot, rebuilt lazily
+        # after anything other than an append changes the order
+        self._order = array("i")
+        self._positions = array("i")
+        self._order_valid = True
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        slot = self._head
+        while slot != NIL:
+            yield SongRef(self, slot)
+            slot = self.next_links[slot]
+
+    def _ref(self, slot):
+        return SongRef(self, slot) if slot != NIL else None
+
+    @property
+    def head(self):
+        return self._ref(self._head)
+
+    @property
+    def tail(self):
+        return self._ref(self._tail)
+
+    @property
+    def current(self):
+        return self._ref(self._current)
+
+    @current.setter
+    def current(self, song):
+        self._current = song.slot if song is not None else NIL
+
+    def add_song(self, title, artist, path, duration=0):
+        # Artist names repeat across a library, keep one copy of each
+        artist = sys.intern(artist)
+        if self._free:
+            slot = self._free.pop()
+            self.titles[slot] = title
+            self.artists[slot] = artist
+            self.paths[slot] = path
+            self.play_counts[slot] = 0
+            self.durations[slot] = duration
+        else:
+            slot = len(self.titles)
+            self.titles.append(title)
+            self.artists.append(artist)
+            self.paths.append(path)
+            self.play_counts.append(0)
+            self.durations.append(duration)
+            self.prev_links.append(NIL)
+            self.next_links.append(NIL)
+            self._positions.append(NIL)
+
+        self.prev_links[slot] = self._tail
+        self.next_links[slot] = NIL
+        if self._tail != NIL:
+            self.next_links[self._tail] = slot
+        else:
+            self._head = slot
+        self._tail = slot
+
+        if self._order_valid:
+            self._positions[slot] = len(self._order)
+            self._order.append(slot)
+        self.size += 1
+
+    def remove_node(self, song):
+        slot = song.slot
+        prev = self.prev_links[slot]
+        nxt = self.next_links[slot]
+        if prev != NIL:
+            self.next_links[prev] = nxt
+        else:
+            self._head = nxt
+        if nxt != NIL:
+            self.prev_links[nxt] = prev
+        else:
+            self._tail = prev
+        if self._current == slot:
+            self._current = NIL
+
+        self.titles[slot] = self.artists[slot] = self.paths[slot] = None
+        self._free.append(slot)
+        self._order_valid = False
+        self.size -= 1
+
+    def pop_node(self, index=-1):
+        song = self.node_at(index)
+        self.remove_node(song)
+        return song
+
+    def node_at(self, index):
+        if index < 0:
+            index += self.size
+        if index < 0 or index >= self.size:
+            raise IndexError("playlist index out of range")
+        self._ensure_order()
+        return SongRef(self, self._order[index])
+
+    def index_of(self, song):
+        self._ensure_order()
+        return self._positions[song.slot]
+
+    def to_list(self):
+        return list(self)
+
+    def from_list(self, songs):
+        # Read before clearing: the songs may be this playlist's own SongRefs
+        rows = [(song.title, song.artist, song.path, getattr(song, "duration", 0),
+                 getattr(song, "play_count", 0)) for song in songs]
+        self.clear()
+        for title, artist, path, duration, play_count in rows:
+            self.add_song(title, artist, path, duration)
+            self.play_counts[self._tail] = play_count
+
+    def clear(self):
+        self.__init__()
+
+    def shuffle(self):
+        slots = self._slots()
+        random.shuffle(slots)
+        self._relink(slots)
+
+    def shuffle_order(self, rng=random):
+        return ShuffleOrder(self, rng)
+
+    def sort_by(self, *keys, reverse=False):
+        columns = {
+            "title": self.titles,
+            "artist": self.artists,
+            "path": self.paths,
+            "play_count": self.play_counts,
+            "duration": self.durations,
+        }
+        selected = [columns[key] for key in keys]
+        if len(selected) == 1:
+            key = selected[0].__getitem__
+        else:
+            key = lambda slot: tuple(column[slot] for column in selected)
+        slots = self._slots()
+        slots.sort(key=key, reverse=reverse)
+        self._relink(slots)
+
+    def _slots(self):
+        slots = []
+        slot = self._head
+        while slot != NIL:
+            slots.append(slot)
+            slot = self.next_links[slot]
+        return slots
+
+    def _relink(self, slots):
+        prev = NIL
+        for slot in slots:
+            self.prev_links[slot] = prev
+            if prev != NIL:
+                self.next_links[prev] = slot
+            prev = slot
+        if prev != NIL:
+            self.next_links[prev] = NIL
+        self._head = slots[0] if slots else NIL
+        self._tail = prev
+        self._order = array("i", slots)
+        self._index_positions()
+
+    def _ensure_order(self):
+        if not self._order_valid:
+            self._order = array("i", self._slots())
+            self._index_positions()
+
+    def _index_positions(self):
+        positions = self._positions
+        for position, slot in enumerate(self._order):
+            positions[slot] = position
+        self._order_valid = True
@@ -0,0 +1,68 @@
+import sys
+
+
+# One song of the library: what every playlist entry of it points at, so
+# its play count is the same wherever it is listed
+class SongRecord:
+    __slots__ = ("title", "artist", "path", "duration", "play_count", "song_id")
+
+    def __init__(self, title, artist, path, duration=0, song_id=None, play_count=0):
+        self.title = title
+        self.artist = artist
+        self.path = path
+        self.duration = duration
+        self.song_id = song_id
+        self.play_count = play_count
+
+    def __repr__(self):
+        return f"SongRecord({self.title!r}, {self.artist!r}, {self.path!r})"
+
+
+# Every song the player knows, one SongRecord per path.
+#
+# Playlists hold nodes that only point at a record, so a song listed in
+# twenty playlists is stored once and memory grows with the number of
+# different songs rather than playlist entries. Artists are interned, so
+# an artist with a hundred songs keeps a single string; titles are nearly
+# all different and are not.
+class Catalog:
+    def __init__(self):
+        self._records = {}
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+    def __contains__(self, path):
+        return path in self._records
+
+    def get(self, path):
+        return self._records.get(path)
+
+    def song(self, title, artist, path, duration=0, song_id=None, play_count=0):
+        """The record of path, created from these fields the first time it is seen.
+
+        A known record keeps its title and play count; a store id or
+        duration it did not have yet is filled in.
+        """
+        record = self._records.get(path)
+        if record is None:
+            record = self._records[path] = SongRecord(title, sys.intern(artist), path,
+                                                      duration, song_id, play_count)
+        else:
+            if record.song_id is None:
+                record.song_id = song_id
+            if not record.duration:
+                record.duration = duration
+        return record
+
+    def add(self, song):
+        """The record for song: a SongRecord, a node of one, or anything with title/artist/path"""
+        song = getattr(song, "record", song)
+        if isinstance(song, SongRecord):
+            # Adopted as it is, so it stays shared with the catalog it came from
+            return self._records.setdefault(song.path, song)
+        return self.song(song.title, song.artist, song.path, getattr(song, "duration", 0),
+                         getattr(song, "song_id", None), getattr(song, "play_count", 0))
@@ -0,0 +1,222 @@
+"""Playlist jobs from the command line, with no window or audio device.
+
+    python -m dsafy scan ~/Music -o library.m3u8 --tags
+    python -m dsafy sort library.m3u8 -o by-artist.m3u8 --key artist title
+    python -m dsafy shuffle library.m3u8 -o party.pls --seed 7
+    python -m dsafy dedupe library.m3u8 -o clean.m3u8 --by content
+    python -m dsafy merge a.m3u b.pls -o all.m3u8 --dedupe
+    python -m dsafy export "Road Trip" -o road-trip.m3u8
+
+Playlists are read and written as M3U, M3U8 or PLS, as their extension
+says. scan, dedupe, merge and export stream songs from input to output;
+sort and shuffle hold the list in a Playlist, and so does dedupe --by
+content, which has to know every file before it can tell copies apart.
+Timings go to stderr.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from dsafy.playlist import Playlist, PlaylistManager
+from dsafy.playlist_io import ImportReport, batched, present, read_playlist, write_playlist
+from dsafy.search_index import normalize
+
+SORT_KEYS = ("title", "artist", "duration", "path")
+
+DEDUPE_KEYS = {
+    # The same file, however the playlists spell its path
+    "path": lambda song: os.path.normcase(song.path),
+    # The same song, whatever file it is in
+    "title": lambda song: (normalize(song.title), normalize(song.artist)),
+}
+
+
+def _stats(action, count, elapsed):
+    rate = f" ({count / elapsed:,.0f}/s)" if elapsed else ""
+    print(f"{action} {count:,} songs in {elapsed:.2f}s{rate}", file=sys.stderr)
+
+
+def _read(paths, report, check):
+    for path in paths:
+        entries = read_playlist(path, report)
+        if check:
+            entries = present(entries, report)
+        yield from entries
+
+
+def _unique(songs, key):
+    seen = set()
+    for song in songs:
+        value = key(song)
+        if value not in seen:
+            seen.add(value)
+            yield song
+
+
+def _load(args, report):
+    playlist = Playlist()
+    for batch in batched(_read(args.inputs, report, args.check), 10_000):
+        playlist.add_songs(batch)
+    return playlist
+
+
+def scan(args):
+    from dsafy.scanner import LibraryScanner
+    from dsafy.tags import TagCache, TagReader
+
+    tag_reader = TagReader(TagCache()) if args.tags else None
+    scanner = LibraryScanner(args.directories, tag_reader=tag_reader).start()
+    try:
+        count = write_playlist(args.output, (song for batch in scanner for song in batch))
+    finally:
+        if tag_reader:
+            tag_reader.close()
+    progress = scanner.progress()
+    _stats(f"scanned {progress.directories} folders and wrote", count, progress.elapsed)
+    return 0
+
+
+def sort(args):
+    report = ImportReport()
+    start = time.perf_counter()
+    playlist = _load(args, report)
+    _stats("read", len(playlist), time.perf_counter() - start)
+    start = time.perf_counter()
+    playlist.sort_by(*args.key, reverse=args.reverse)
+    _stats("sorted", len(playlist), time.perf_counter() - start)
+    return _finish(args, playlist, report)
+
+
+def shuffle(args):
+    report = ImportReport()
+    start = time.perf_counter()
+    playlist = _load(args, report)
+    _stats("read", len(playlist), time.perf_counter() - start)
+    start = time.perf_counter()
+    playlist.shuffle_nodes(random.Random(args.seed))
+    _stats("shuffled", len(playlist), time.perf_counter() - start)
+    return _finish(args, playlist, report)
+
+
+def dedupe(args):
+    if args.by != "content":
+        args.dedupe = args.by
+        return merge(args)
+    from dsafy.dedupe import DuplicateFinder, HashCache, duplicate_songs, extra_copies
+
+    # Same audio under any name: every path has to be known before the
+    # first song can be written
+    report = ImportReport()
+    start = time.perf_counter()
+    songs = list(_read(args.inputs, report, args.check))
+    _stats("read", len(songs), time.perf_counter() - start)
+    start = time.perf_counter()
+    finder = DuplicateFinder(HashCache())
+    try:
+        groups = duplicate_songs(((None, song) for song in songs), finder)
+    finally:
+        finder.close()
+    extra = {id(song) for _, song in extra_copies(groups)}
+    _stats(f"found {len(extra):,} copies among", len(songs), time.perf_counter() - start)
+    start = time.perf_counter()
+    count = write_playlist(args.output, (song for song in songs if id(song) not in extra))
+    _stats("wrote", count, time.perf_counter() - start)
+    return 0
+
+
+def merge(args):
+    report = ImportReport()
+    songs = _read(args.inputs, report, args.check)
+    if args.dedupe:
+        songs = _unique(songs, DEDUPE_KEYS[args.dedupe])
+    start = time.perf_counter()
+    count = write_playlist(args.output, songs)
+    _stats(f"read {report.entries:,} songs and wrote", count, time.perf_counter() - start)
+    if report.entries > count:
+        print(f"dropped {report.entries - count:,} ({report.missing:,} missing)", file=sys.stderr)
+    return 0
+
+
+def export(args):
+    from dsafy.library_store import LibraryStore
+
+    manager = PlaylistManager(LibraryStore(args.library))
+    manager.load()
+    if args.list:
+        for playlist in manager:
+            print(playlist.name)
+        return 0
+    if not args.name or not args.output:
+        print("dsafy export: a playlist name and -o are needed", file=sys.stderr)
+        return 2
+    for playlist in manager:
+        if playlist.name == args.name:
+            break
+    else:
+        print(f"dsafy export: no playlist named {args.name!r}", file=sys.stderr)
+        return 1
+    start = time.perf_counter()
+    count = manager.export_playlist(playlist, args.output)
+    _stats("exported", count, time.perf_counter() - start)
+    return 0
+
+
+def _finish(args, playlist, report):
+    start = time.perf_counter()
+    count = write_playlist(args.output, playlist)
+    _stats("wrote", count, time.perf_counter() - start)
+    if report.missing or report.skipped:
+        print(f"left out {report.missing:,} missing songs and {report.skipped:,} lines", file=sys.stderr)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m dsafy", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def command(name, func, help, inputs=True, output_required=True):
+        sub = commands.add_parser(name, help=help, description=help)
+        sub.set_defaults(func=func)
+        if inputs:
+            sub.add_argument("inputs", nargs="+", metavar="playlist")
+            sub.add_argument("--check", action="store_true", help="leave out songs whose file is missing")
+        sub.add_argument("-o", "--output", required=output_required, help="playlist file to write")
+        return sub
+
+    sub = command("scan", scan, "write a playlist of the audio files in folders", inputs=False)
+    sub.add_argument("directories", nargs="+", metavar="folder")
+    sub.add_argument("--tags", action="store_true", help="read titles, artists and durations from tags")
+
+    sub = command("sort", sort, "sort playlists into one")
+    sub.add_argument("--key", nargs="+", choices=SORT_KEYS, default=["title"])
+    sub.add_argument("--reverse", action="store_true")
+
+    sub = command("shuffle", shuffle, "shuffle playlists into one")
+    sub.add_argument("--seed", type=int, help="same seed, same order")
+
+    sub = command("dedupe", dedupe, "drop repeated songs, keeping the first")
+    sub.add_argument("--by", choices=sorted(DEDUPE_KEYS) + ["content"], default="path",
+                     help="same file (path), same title and artist (title) "
+                          "or same audio, whatever the file name and tags (content)")
+
+    sub = command("merge", merge, "join playlists in order")
+    sub.add_argument("--dedupe", choices=sorted(DEDUPE_KEYS), help="also drop repeated songs")
+
+    # -o is checked by export itself, as --list does not write a file
+    sub = command("export", export, "write a playlist of the player's library to a file", inputs=False,
+                  output_required=False)
+    sub.add_argument("name", nargs="?", help="playlist to export")
+    sub.add_argument("--list", action="store_true", help="list the stored playlists instead")
+    sub.add_argument("--library", help="library database (default: the player's)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as error:
+        print(f"dsafy {args.command}: {error}", file=sys.stderr)
+        return 1
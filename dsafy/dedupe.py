@@ -0,0 +1,169 @@
+import hashlib
+import mmap
+import os
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from dsafy.file_cache import FileCache, default_cache_path
+from dsafy.tags import audio_span
+
+# Bytes hashed per update; hashlib releases the GIL for each, so the pool's
+# threads hash different files at the same time
+CHUNK_BYTES = 1 << 20
+# Files whose audio is the same length are first told apart by this much
+# of the audio, and only the ones still alike are hashed in full
+QUICK_BYTES = 64 * 1024
+
+# What HashCache keeps of a file: the byte range of its audio and the hash
+# of that range
+CachedHash = namedtuple("CachedHash", "start end digest")
+
+
+def hash_span(path, start, end):
+    """Hex digest of the bytes start:end of a file, read through mmap"""
+    digest = hashlib.blake2b(digest_size=20)
+    if end > start:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                end = min(end, len(mapped))
+                for offset in range(start, end, CHUNK_BYTES):
+                    digest.update(view[offset:min(offset + CHUNK_BYTES, end)])
+            finally:
+                view.release()
+    return digest.hexdigest()
+
+
+def _identity(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return path, stat.st_size, stat.st_mtime
+
+
+def _span(path):
+    try:
+        return audio_span(path)
+    except (OSError, ValueError):
+        return None
+
+
+def _hash(path, start, end):
+    try:
+        return hash_span(path, start, end)
+    except (OSError, ValueError):
+        return None
+
+
+# Audio span and hash of each file, cached by file identity in
+# ~/.dsafy/hashes.sqlite, so an unchanged file is never read again. digest
+# is None for files whose span was needed but never their hash.
+class HashCache(FileCache):
+    def __init__(self, path=None):
+        super().__init__(path or default_cache_path("hashes.sqlite"), "hashes",
+                         ("start INTEGER", "end INTEGER", "digest TEXT"), CachedHash)
+
+
+# Finds files that hold the same audio, whatever their names and tags.
+#
+# Candidates are narrowed in steps that each read less than the next: the
+# length of the audio data (from the headers, so retagged copies still
+# match), a hash of its first QUICK_BYTES, and only then a hash of all of
+# it. Files are read through mmap on a thread pool, tags are never hashed,
+# and spans and full hashes are cached by file identity.
+class DuplicateFinder:
+    def __init__(self, cache=None, workers=8):
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="dedupe")
+
+    def groups(self, paths):
+        """Lists of paths with the same audio, each in the order given, two or more per list"""
+        paths = list(dict.fromkeys(paths))
+        files = [f for f in self._pool.map(_identity, paths) if f]
+        known = self.cache.lookup_many(files) if self.cache else {}
+
+        spans = {path: (start, end) for path, (start, end, _) in known.items()}
+        misses = [f for f in files if f[0] not in known]
+        for (path, _, _), span in zip(misses, self._pool.map(_span, [f[0] for f in misses])):
+            if span:
+                spans[path] = span
+
+        by_length = defaultdict(list)
+        for path, size, mtime in files:
+            span = spans.get(path)
+            if span and span[1] > span[0]:
+                by_length[span[1] - span[0]].append(path)
+        candidates = [group for group in by_length.values() if len(group) > 1]
+
+        digests = {path: known[path][2] for group in candidates for path in group
+                   if path in known and known[path][2]}
+        for group in candidates:
+            unhashed = [path for path in group if path not in digests]
+            if len(unhashed) == len(group):
+                # Nothing known yet: look at the start of the audio first
+                start, end = spans[group[0]]
+                quick = self._hash_all([(path, spans[path][0], spans[path][0] + min(end - start, QUICK_BYTES))
+                                        for path in group])
+                if end - start <= QUICK_BYTES:
+                    # That was all of it
+                    digests.update(quick)
+                    continue
+                alike = defaultdict(list)
+                for path in group:
+                    alike[quick.get(path)].append(path)
+                unhashed = [path for key, same in alike.items() if key and len(same) > 1 for path in same]
+            digests.update(self._hash_all([(path, *spans[path]) for path in unhashed]))
+
+        if self.cache:
+            identity = {f[0]: f for f in files}
+            self.cache.store_many((*identity[path], CachedHash(*spans[path], digests.get(path)))
+                                  for path in spans if path not in known or
+                                  (digests.get(path) and not known[path][2]))
+
+        order = {path: i for i, path in enumerate(paths)}
+        by_digest = defaultdict(list)
+        for path, digest in digests.items():
+            if digest:
+                by_digest[spans[path][1] - spans[path][0], digest].append(path)
+        return sorted((sorted(group, key=order.get) for group in by_digest.values() if len(group) > 1),
+                      key=lambda group: order[group[0]])
+
+    def _hash_all(self, spans):
+        results = self._pool.map(lambda span: _hash(*span), spans)
+        return {path: digest for (path, _, _), digest in zip(spans, results)}
+
+    def close(self):
+        self._pool.shutdown()
+        if self.cache:
+            self.cache.close()
+
+
+def duplicate_songs(entries, finder):
+    """Group (owner, song) pairs whose songs are the same file or the same audio.
+
+    Returns lists of two or more pairs, each in the order given; owner is
+    whatever the caller needs to remove the song again (its playlist).
+    """
+    entries = list(entries)
+    same_audio = {}
+    for group in finder.groups(song.path for _, song in entries):
+        for path in group:
+            same_audio[path] = group[0]
+    by_audio = defaultdict(list)
+    for owner, song in entries:
+        by_audio[same_audio.get(song.path, song.path)].append((owner, song))
+    return [group for group in by_audio.values() if len(group) > 1]
+
+
+def extra_copies(groups):
+    """The pairs of groups to remove so each owner keeps only its first copy"""
+    extra = []
+    for group in groups:
+        owners = set()
+        for owner, song in group:
+            if owner in owners:
+                extra.append((owner, song))
+            else:
+                owners.add(owner)
+    return extra
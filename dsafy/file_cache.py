@@ -0,0 +1,58 @@
+import os
+import sqlite3
+import threading
+
+
+def default_cache_path(name):
+    """Where the player keeps the cache file name: ~/.dsafy/name"""
+    return os.path.join(os.path.expanduser("~"), ".dsafy", name)
+
+
+# On-disk cache of what was read or worked out from a file, keyed by path
+# and checked against (mtime, size), so an unchanged file costs only the
+# stat the caller already did.
+#
+# Each cache is one table: the key columns, then the value columns given as
+# "name TYPE". A value is stored as the tuple of its columns and read back
+# as value_type(*columns), a namedtuple of the module that owns the cache.
+class FileCache:
+    def __init__(self, path, table, columns, value_type):
+        self.path = path
+        self.table = table
+        self.value_type = value_type
+        self._names = ", ".join(column.split()[0] for column in columns)
+        self._width = len(columns)
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(f"""CREATE TABLE IF NOT EXISTS {table} (
+            path TEXT PRIMARY KEY, mtime REAL, size INTEGER, {", ".join(columns)})""")
+        self._db.commit()
+
+    def lookup_many(self, files):
+        """Map path -> value for every (path, size, mtime) still current in the cache"""
+        found = {}
+        wanted = {path: (size, mtime) for path, size, mtime in files}
+        paths = list(wanted)
+        with self._lock:
+            for start in range(0, len(paths), 500):
+                chunk = paths[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT path, mtime, size, {self._names} FROM {self.table} "
+                    f"WHERE path IN ({','.join('?' * len(chunk))})", chunk)
+                for path, mtime, size, *values in rows:
+                    if wanted[path] == (size, mtime):
+                        found[path] = self.value_type(*values)
+        return found
+
+    def store_many(self, entries):
+        """Save (path, size, mtime, value) rows in one transaction"""
+        placeholders = ", ".join("?" * (3 + self._width))
+        with self._lock, self._db:
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO {self.table} VALUES ({placeholders})",
+                [(path, mtime, size, *value) for path, size, mtime, value in entries])
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,151 @@
+from dsafy.search_index import normalize
+
+
+def edit_distance(a, b, limit=None):
+    """Levenshtein distance between a and b.
+
+    With a limit, stops as soon as the distance is known to exceed it and
+    returns limit + 1.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ca != cb)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def max_typos(word):
+    """Edits allowed for a query word: none for very short words, then one, then two"""
+    if len(word) < 4:
+        return 0
+    return 1 if len(word) < 7 else 2
+
+
+def _index_depth(word):
+    # Deletes to index for a word: as many as the longest query that can
+    # be within its max_typos of the word is allowed
+    if len(word) >= 5:
+        return 2
+    return 1 if len(word) >= 3 else 0
+
+
+def _deletes(word, depth):
+    """word and every string left after deleting up to depth characters"""
+    variants = {word}
+    frontier = variants
+    for _ in range(depth):
+        frontier = {v[:i] + v[i + 1:] for v in frontier for i in range(len(v))}
+        variants |= frontier
+    return variants
+
+
+# Typo tolerant lookup of songs by the words in their title and artist.
+#
+# A symmetric-delete dictionary: every distinct word is filed under each
+# string left by deleting up to two of its characters. Two words within k
+# edits always share such a string with at most k deletes on each side, so
+# a query only looks up its own few dozen deletes and checks the words found
+# there with a bounded edit distance, instead of comparing itself with the
+# whole vocabulary. Deletes are filed by hash to save memory; a collision
+# only adds a candidate that the distance check then drops.
+#
+# Words stay filed once seen and are skipped when no song uses them any more.
+class FuzzyIndex:
+    def __init__(self):
+        # key -> (item, set of words)
+        self._docs = {}
+        # word -> keys of songs using it
+        self._words = {}
+        # hash of a delete -> word, or list of words when several share it
+        self._deletes = {}
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, key):
+        return key in self._docs
+
+    @property
+    def word_count(self):
+        """Distinct words filed so far"""
+        return len(self._words)
+
+    def add(self, key, item, *fields):
+        if key in self._docs:
+            self.remove(key)
+        words = set(" ".join(normalize(field) for field in fields if field).split())
+        self._docs[key] = (item, words)
+        for word in words:
+            keys = self._words.get(word)
+            if keys is None:
+                keys = self._words[word] = set()
+                self._insert(word)
+            keys.add(key)
+
+    def remove(self, key):
+        item, words = self._docs.pop(key)
+        for word in words:
+            self._words[word].discard(key)
+
+    def _insert(self, word):
+        deletes = self._deletes
+        for variant in _deletes(word, _index_depth(word)):
+            slot = hash(variant)
+            filed = deletes.get(slot)
+            if filed is None:
+                deletes[slot] = word
+            elif type(filed) is str:
+                deletes[slot] = [filed, word]
+            else:
+                filed.append(word)
+
+    def similar_words(self, word, max_distance):
+        """(distance, word) for indexed words within max_distance edits of word"""
+        candidates = set()
+        for variant in _deletes(word, max_distance):
+            filed = self._deletes.get(hash(variant))
+            if filed is None:
+                continue
+            if type(filed) is str:
+                candidates.add(filed)
+            else:
+                candidates.update(filed)
+        found = []
+        for candidate in candidates:
+            if self._words[candidate]:
+                distance = edit_distance(word, candidate, max_distance)
+                if distance <= max_distance:
+                    found.append((distance, candidate))
+        return found
+
+    def search(self, query, limit=100):
+        """Items with a close word for every query word, fewest edits first"""
+        words = normalize(query).split()
+        if not words:
+            return []
+        # key -> total edits over the query words so far
+        totals = None
+        for word in words:
+            matches = {}
+            for distance, match in self.similar_words(word, max_typos(word)):
+                for key in self._words[match]:
+                    if distance < matches.get(key, distance + 1):
+                        matches[key] = distance
+            if totals is None:
+                totals = matches
+            else:
+                totals = {key: totals[key] + distance
+                          for key, distance in matches.items() if key in totals}
+            if not totals:
+                return []
+        best = sorted(totals, key=totals.get)[:limit]
+        return [self._docs[key][0] for key in best]
@@ -0,0 +1,217 @@
+from bisect import bisect_right
+from contextlib import contextmanager
+from itertools import islice
+
+# Nodes per chunk of an Order; an edit copies one or two chunks and the
+# short tables that index them, and shares every other chunk
+CHUNK_SIZE = 512
+
+# Versions kept per playlist, not counting the one it started from
+HISTORY_LIMIT = 100
+
+
+def _chunked(nodes):
+    nodes = iter(nodes)
+    while True:
+        chunk = tuple(islice(nodes, CHUNK_SIZE))
+        if not chunk:
+            return
+        yield chunk
+
+
+# An immutable order of playlist nodes.
+#
+# Nodes are kept in tuples of up to CHUNK_SIZE, with the position each chunk
+# starts at next to it. insert, remove and move return a new Order that
+# shares all chunks but the ones the edit touched, so many versions of a
+# large playlist cost one copy plus the chunks that changed between them.
+class Order:
+    __slots__ = ("_chunks", "_starts", "size")
+
+    def __init__(self, chunks=(), starts=None, size=None):
+        self._chunks = tuple(chunks)
+        if starts is None:
+            starts = []
+            size = 0
+            for chunk in self._chunks:
+                starts.append(size)
+                size += len(chunk)
+        self._starts = tuple(starts)
+        self.size = size
+
+    @classmethod
+    def of(cls, nodes):
+        return cls(_chunked(nodes))
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield from chunk
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("order index out of range")
+        i = bisect_right(self._starts, index) - 1
+        return self._chunks[i][index - self._starts[i]]
+
+    def insert(self, index, nodes):
+        return self._splice(index, index, tuple(nodes))
+
+    def remove(self, index, count=1):
+        return self._splice(index, index + count, ())
+
+    def move(self, old_index, index):
+        """The node at old_index taken out and put back at index"""
+        node = self[old_index]
+        return self.remove(old_index).insert(index, (node,))
+
+    def _splice(self, start, stop, nodes):
+        """Replace the nodes start:stop with nodes, copying only the chunks in between"""
+        if not 0 <= start <= stop <= self.size:
+            raise IndexError("order index out of range")
+        chunks, starts = self._chunks, self._starts
+        if not chunks:
+            return Order(_chunked(nodes))
+        # Chunks first to last hold start and stop; an insert at the very
+        # end goes into the last chunk
+        first = max(bisect_right(starts, start) - 1, 0)
+        last = max(bisect_right(starts, stop - 1) - 1, first) if stop > start else first
+        middle = (chunks[first][:start - starts[first]] + nodes
+                  + chunks[last][stop - starts[last]:])
+        if len(middle) > CHUNK_SIZE * 2:
+            middle = list(_chunked(middle))
+        else:
+            middle = [middle] if middle else []
+
+        new_starts = list(starts[:first])
+        position = starts[first]
+        for chunk in middle:
+            new_starts.append(position)
+            position += len(chunk)
+        shift = position - (starts[last] + len(chunks[last]))
+        new_starts.extend(begin + shift for begin in starts[last + 1:])
+        return Order(chunks[:first] + tuple(middle) + chunks[last + 1:], new_starts,
+                     self.size + len(nodes) - (stop - start))
+
+
+# Undo and redo for the order of an IndexedList (a playlist's songs, or the
+# list of playlists).
+#
+# Follows the list's change events and keeps one Order per change, so a
+# sort or shuffle can be taken back without sorting again. Stepping to
+# another version is O(1); putting it on screen relinks the existing nodes
+# once, in O(n) with nothing allocated per song. Versions share the chunks
+# they have in common: after adding a song only its chunk is new, while a
+# sort or shuffle keeps one reference per song.
+#
+# Changes made inside batch() (or between begin_batch() and end_batch())
+# make a single version, so removing duplicates or importing a file is
+# undone in one step and does not push out the rest of the history.
+#
+# A playlist whose current song is not in the restored version has its
+# current cleared.
+class PlaylistHistory:
+    def __init__(self, playlist, limit=HISTORY_LIMIT):
+        self.playlist = playlist
+        self.limit = limit
+        self._versions = [Order.of(playlist)]
+        self._position = 0
+        self._restoring = False
+        # Open batches, and the order they have made so far
+        self._batches = 0
+        self._pending = None
+        playlist.subscribe(self._changed)
+
+    def __len__(self):
+        return len(self._versions)
+
+    def can_undo(self):
+        return self._position > 0
+
+    def can_redo(self):
+        return self._position < len(self._versions) - 1
+
+    @contextmanager
+    def batch(self):
+        """Record every change made in the with block as one version"""
+        self.begin_batch()
+        try:
+            yield self
+        finally:
+            self.end_batch()
+
+    def begin_batch(self):
+        """Start a batch that spans more than one call, such as an import stepped from the Tk loop"""
+        self._batches += 1
+
+    def end_batch(self):
+        self._batches -= 1
+        if not self._batches:
+            self._commit()
+
+    def undo(self):
+        """Put back the order before the last change; False if there is none"""
+        # Changes of a batch still open are a version of their own
+        self._commit()
+        if not self.can_undo():
+            return False
+        self._position -= 1
+        self._restore(self._versions[self._position])
+        return True
+
+    def redo(self):
+        """Make the last undone change again; False if there is none"""
+        self._commit()
+        if not self.can_redo():
+            return False
+        self._position += 1
+        self._restore(self._versions[self._position])
+        return True
+
+    def close(self):
+        self.playlist.unsubscribe(self._changed)
+
+    def _restore(self, order):
+        self._restoring = True
+        try:
+            self.playlist.replace_nodes(order)
+        finally:
+            self._restoring = False
+        current = getattr(self.playlist, "current", None)
+        if current is not None and current not in self.playlist:
+            self.playlist.current = None
+
+    def _changed(self, event):
+        if self._restoring or event.kind == "update":
+            return
+        order = self._pending if self._pending is not None else self._versions[self._position]
+        if event.kind == "insert":
+            order = order.insert(event.index, self.playlist.window(event.index, event.count))
+        elif event.kind == "remove":
+            order = order.remove(event.index, event.count)
+        elif event.kind == "move":
+            order = order.move(event.old_index, event.index)
+        else:
+            # reorder and reset: a sort, shuffle or clear
+            order = Order.of(self.playlist)
+        if self._batches:
+            self._pending = order
+        else:
+            self._add_version(order)
+
+    def _commit(self):
+        if self._pending is not None:
+            order, self._pending = self._pending, None
+            self._add_version(order)
+
+    def _add_version(self, order):
+        # A change after an undo drops the versions that could be redone
+        del self._versions[self._position + 1:]
+        self._versions.append(order)
+        if len(self._versions) > self.limit + 1:
+            del self._versions[0]
+        self._position = len(self._versions) - 1
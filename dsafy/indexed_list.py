@@ -0,0 +1,548 @@
+import math
+import random
+import weakref
+from collections import namedtuple
+
+# A node is balanced when neither child holds more than ALPHA of its subtree
+ALPHA = 0.7
+_LOG_INV_ALPHA = math.log(1 / ALPHA)
+
+
+# Base node for doubly linked lists with positional access
+class IndexedNode:
+    __slots__ = ("prev", "next", "_left", "_right", "_parent", "_count")
+
+    def __init__(self):
+        self.prev = None
+        self.next = None
+        # Order-statistic tree links, threaded through the same nodes
+        self._left = None
+        self._right = None
+        self._parent = None
+        self._count = 1
+
+
+# What changed in an IndexedList: kind is "insert", "remove", "move",
+# "update", "reorder" (same nodes, new order) or "reset"; count rows
+# starting at index are affected, old_index is where a moved node came
+# from and nodes holds the nodes a remove took out
+ChangeEvent = namedtuple("ChangeEvent", "kind index count old_index nodes", defaults=(1, None, None))
+
+
+def _count(node):
+    return node._count if node else 0
+
+
+# Doubly linked list with a scapegoat tree over the same nodes.
+# The list keeps the usual head/tail/prev/next walking, the tree answers
+# "which node is at position i" without walking from the head.
+class IndexedList:
+    def __init__(self):
+        self.head = None
+        self.tail = None
+        self.size = 0
+        self._root = None
+        self._max_size = 0
+        # Nodes appended at the tail that the tree does not cover yet
+        self._pending = 0
+        self._listeners = []
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        node = self.head
+        while node:
+            yield node
+            node = node.next
+
+    def __contains__(self, node):
+        """Whether node is in this list, in O(log n)"""
+        if node is None:
+            return False
+        try:
+            self.index_of(node)
+        except ValueError:
+            return False
+        return True
+
+    def subscribe(self, listener):
+        """Call listener(ChangeEvent) after every change to the list"""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def _notify(self, kind, index, count=1, old_index=None, nodes=None):
+        event = ChangeEvent(kind, index, count, old_index, nodes)
+        for listener in list(self._listeners):
+            listener(event)
+
+    def window(self, start, count):
+        """Up to count nodes from position start: one lookup, then next links"""
+        nodes = []
+        if start >= self.size or count <= 0:
+            return nodes
+        node = self.node_at(start)
+        while node and len(nodes) < count:
+            nodes.append(node)
+            node = node.next
+        return nodes
+
+    def touch(self, node):
+        """Tell listeners that something shown for node has changed"""
+        if self._listeners:
+            self._notify("update", self.index_of(node))
+
+    def clear(self):
+        self.head = None
+        self.tail = None
+        self.size = 0
+        self._root = None
+        self._max_size = 0
+        self._pending = 0
+        if self._listeners:
+            self._notify("reset", 0, 0)
+
+    def node_at(self, index):
+        """Return the node at position index in O(log n)"""
+        if index < 0:
+            index += self.size
+        if index < 0 or index >= self.size:
+            raise IndexError("playlist index out of range")
+        if index == 0:
+            return self.head
+        if index == self.size - 1:
+            return self.tail
+
+        self._sync()
+        node = self._root
+        while True:
+            left = _count(node._left)
+            if index < left:
+                node = node._left
+            elif index == left:
+                return node
+            else:
+                index -= left + 1
+                node = node._right
+
+    def index_of(self, node):
+        """Return the position of node in O(log n) by climbing the tree"""
+        if node is self.head:
+            return 0
+        if node is self.tail:
+            return self.size - 1
+
+        self._sync()
+        index = _count(node._left)
+        while node._parent:
+            parent = node._parent
+            if node is parent._right:
+                index += _count(parent._left) + 1
+            node = parent
+        if node is not self._root:
+            raise ValueError("node is not in this playlist")
+        return index
+
+    def node_after(self, node):
+        return node.next
+
+    def node_before(self, node):
+        return node.prev
+
+    def append_node(self, node):
+        """Link node at the end of the list in O(1).
+
+        The tree is only extended when a positional lookup next needs it,
+        so bulk loads cost a single balanced rebuild.
+        """
+        self._link_tail(node)
+        if self._listeners:
+            self._notify("insert", self.size - 1)
+
+    def extend_nodes(self, nodes):
+        """Append several nodes, reported to listeners as one insert"""
+        start = self.size
+        for node in nodes:
+            self._link_tail(node)
+        if self._listeners and self.size > start:
+            self._notify("insert", start, self.size - start)
+
+    def _link_tail(self, node):
+        node.prev = self.tail
+        node.next = None
+        if self.tail:
+            self.tail.next = node
+        else:
+            self.head = node
+        self.tail = node
+        self.size += 1
+        self._pending += 1
+
+    def insert_node(self, index, node):
+        """Link node so that it ends up at position index"""
+        if index < 0:
+            index += self.size
+        if index < 0 or index > self.size:
+            raise IndexError("playlist index out of range")
+        if index == self.size:
+            self.append_node(node)
+            return
+
+        after = self.node_at(index)
+        self._sync()
+        before = after.prev
+        node.prev = before
+        node.next = after
+        after.prev = node
+        if before:
+            before.next = node
+        else:
+            self.head = node
+
+        node._left = node._right = None
+        node._count = 1
+        # The predecessor of after is either free on its right
+        # or after itself has no left child
+        if after._left is None:
+            after._left = node
+            node._parent = after
+        else:
+            before._right = node
+            node._parent = before
+        self.size += 1
+        self._grow(node)
+        if self._listeners:
+            self._notify("insert", index)
+
+    def move_node(self, node, index):
+        """Move node to position index, reported to listeners as one move"""
+        listeners, self._listeners = self._listeners, []
+        try:
+            old_index = self.index_of(node)
+            self.remove_node(node)
+            self.insert_node(index, node)
+        finally:
+            self._listeners = listeners
+        if self._listeners:
+            self._notify("move", index, 1, old_index)
+
+    def pop_node(self, index=-1):
+        """Unlink and return the node at position index"""
+        node = self.node_at(index)
+        self.remove_node(node)
+        return node
+
+    def remove_node(self, node):
+        """Unlink node from both the list and the tree in O(log n)"""
+        index = self.index_of(node) if self._listeners else None
+        self._sync()
+        if node._left and node._right:
+            # The in-order successor is the list successor and has no left child
+            successor = node.next
+            self._splice(successor)
+            successor._left = node._left
+            successor._right = node._right
+            successor._count = node._count
+            if successor._left:
+                successor._left._parent = successor
+            if successor._right:
+                successor._right._parent = successor
+            self._replace_child(node, successor)
+        else:
+            self._splice(node)
+
+        if node.prev:
+            node.prev.next = node.next
+        else:
+            self.head = node.next
+        if node.next:
+            node.next.prev = node.prev
+        else:
+            self.tail = node.prev
+
+        node.prev = node.next = None
+        node._left = node._right = node._parent = None
+        node._count = 1
+        self.size -= 1
+
+        if self.size < ALPHA * self._max_size:
+            self._rebuild()
+        if self._listeners:
+            self._notify("remove", index, nodes=(node,))
+
+    def sort_nodes(self, key, reverse=False):
+        """Stable in-place sort that relinks the existing nodes.
+
+        No node is created or dropped, so references such as a playlist's
+        current song and any per-node state survive the sort.
+        """
+        if self.size < 2:
+            return
+        # list.sort on the node references does the comparing in C; only
+        # the links are rewritten, and the tree is rebuilt once in O(n)
+        nodes = list(self)
+        nodes.sort(key=key, reverse=reverse)
+        self._chain(nodes)
+
+    def shuffle_nodes(self, rng=random):
+        """Uniform in-place shuffle that relinks the existing nodes"""
+        if self.size < 2:
+            return
+        nodes = list(self)
+        rng.shuffle(nodes)
+        self._chain(nodes)
+
+    def shuffle_order(self, rng=random):
+        """Lazily drawn random play order, see ShuffleOrder"""
+        return ShuffleOrder(self, rng)
+
+    def _chain(self, nodes):
+        """Link the next pointers of nodes in this order, then restore the rest"""
+        for node, following in zip(nodes, nodes[1:]):
+            node.next = following
+        nodes[-1].next = None
+        self._relink_chain(nodes[0])
+
+    def replace_nodes(self, nodes):
+        """Make the list hold nodes in this order, reported as one reset.
+
+        The nodes are relinked as they are, so they may be ones this list
+        held before (an earlier version of its order) but no other list's.
+        """
+        # Nodes left out must not point into the new tree, or index_of
+        # (and so `in`) would find them there
+        node = self.head
+        while node:
+            node._parent = None
+            node = node.next
+        self._relink(nodes)
+
+    def _relink(self, nodes):
+        """Replace the contents with existing nodes in the given order"""
+        self.head = None
+        self.tail = None
+        self.size = 0
+        prev = None
+        for node in nodes:
+            node.prev = prev
+            if prev:
+                prev.next = node
+            else:
+                self.head = node
+            prev = node
+            self.size += 1
+        if prev:
+            prev.next = None
+        self.tail = prev
+        self._rebuild()
+        if self._listeners:
+            self._notify("reset", 0, self.size)
+
+    def _relink_chain(self, head):
+        """Restore prev links, tail and tree after the next links were rewired"""
+        self.head = head
+        prev = None
+        node = head
+        while node:
+            node.prev = prev
+            prev = node
+            node = node.next
+        self.tail = prev
+        self._rebuild()
+        if self._listeners:
+            self._notify("reorder", 0, self.size)
+
+    # --- tree maintenance -------------------------------------------------
+
+    def _sync(self):
+        """Bring appended tail nodes into the tree"""
+        if not self._pending:
+            return
+        if self._pending * 2 > self.size:
+            self._rebuild()
+            return
+        node = self.tail
+        for _ in range(self._pending - 1):
+            node = node.prev
+        while node and self._pending:
+            # The previous node is the rightmost one already in the tree
+            self._pending -= 1
+            node._left = node._right = None
+            node._count = 1
+            node._parent = node.prev
+            node.prev._right = node
+            self._grow(node)
+            node = node.next
+
+    def _grow(self, node):
+        """Fix counts above a freshly attached leaf and rebalance if too deep"""
+        indexed = self.size - self._pending
+        self._max_size = max(self._max_size, indexed)
+        depth = 0
+        parent = node._parent
+        while parent:
+            parent._count += 1
+            parent = parent._parent
+            depth += 1
+        if depth > math.log(indexed) / _LOG_INV_ALPHA:
+            self._rebalance_from(node)
+
+    def _replace_child(self, old, new):
+        parent = old._parent
+        if new:
+            new._parent = parent
+        if parent is None:
+            self._root = new
+        elif parent._left is old:
+            parent._left = new
+        else:
+            parent._right = new
+
+    def _splice(self, node):
+        """Remove a tree node with at most one child"""
+        child = node._left or node._right
+        self._replace_child(node, child)
+        parent = node._parent
+        while parent:
+            parent._count -= 1
+            parent = parent._parent
+
+    def _rebalance_from(self, node):
+        # Walk up to the first ancestor whose heavy side breaks the ALPHA bound
+        while node._parent:
+            parent = node._parent
+            if node._count > ALPHA * parent._count:
+                self._rebuild_subtree(parent)
+                return
+            node = parent
+        self._rebuild()
+
+    def _rebuild_subtree(self, top):
+        first = top
+        while first._left:
+            first = first._left
+        parent = top._parent
+        was_left = parent is not None and parent._left is top
+        subtree, _ = self._build(first, top._count)
+        subtree._parent = parent
+        if parent is None:
+            self._root = subtree
+        elif was_left:
+            parent._left = subtree
+        else:
+            parent._right = subtree
+
+    def _rebuild(self):
+        self._pending = 0
+        self._max_size = self.size
+        self._root, _ = self._build(self.head, self.size)
+        if self._root:
+            self._root._parent = None
+
+    def _build(self, first, count):
+        """Build a perfectly balanced tree over count list nodes from first.
+
+        In-order position equals list position, so the nodes are consumed
+        straight off the next links. Returns (subtree root, node after it).
+        """
+        if count == 0:
+            return None, first
+        left_count = (count - 1) // 2
+        left, root = self._build(first, left_count)
+        right, after = self._build(root.next, count - 1 - left_count)
+        root._left = left
+        root._right = right
+        root._count = count
+        if left:
+            left._parent = root
+        if right:
+            right._parent = root
+        return root, after
+
+
+# Random play order drawn one step at a time: a Fisher-Yates shuffle over
+# positions where only the swapped slots are remembered, so nothing is
+# reordered or copied up front. Each step is O(1) bookkeeping plus one
+# node_at, so O(log n) on an IndexedList.
+#
+# Positions only hold while the playlist keeps its shape. The first insert,
+# remove, move or reorder during a round turns what is left of it into a
+# list of the nodes not drawn yet (O(n), once); from then on a step is O(1),
+# added songs join the round and removed ones leave it, and no song is
+# played twice. The order follows the playlist through a weak listener, so
+# an order that is dropped does not stay subscribed.
+class ShuffleOrder:
+    def __init__(self, playlist, rng=random):
+        self.playlist = playlist
+        self.rng = rng
+        self.reset()
+        if hasattr(playlist, "subscribe"):
+            method = weakref.WeakMethod(self._changed)
+
+            def listener(event):
+                changed = method()
+                if changed is None:
+                    playlist.unsubscribe(listener)
+                else:
+                    changed(event)
+
+            playlist.subscribe(listener)
+
+    def reset(self):
+        """Start a new round over the playlist as it is now"""
+        self._size = len(self.playlist)
+        self._drawn = 0
+        self._swapped = {}
+        # Nodes drawn this round, and the undrawn nodes once positions are given up
+        self._seen = set()
+        self._pool = None
+
+    def remaining(self):
+        if self._pool is not None:
+            return len(self._pool)
+        return self._size - self._drawn
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        pool = self._pool
+        if pool is not None:
+            if not pool:
+                raise StopIteration
+            j = self.rng.randrange(len(pool))
+            pool[j], pool[-1] = pool[-1], pool[j]
+            node = pool.pop()
+            self._seen.add(node)
+            return node
+        if self._drawn >= self._size:
+            raise StopIteration
+        i = self._drawn
+        j = self.rng.randrange(i, self._size)
+        swapped = self._swapped
+        position = swapped.get(j, j)
+        if j != i:
+            swapped[j] = swapped.pop(i, i)
+        else:
+            swapped.pop(i, None)
+        self._drawn += 1
+        node = self.playlist.node_at(position)
+        self._seen.add(node)
+        return node
+
+    def _changed(self, event):
+        if event.kind == "update":
+            return
+        if self._pool is None:
+            self._pool = [node for node in self.playlist if node not in self._seen]
+            self._swapped = {}
+        elif event.kind == "insert":
+            self._pool.extend(self.playlist.window(event.index, event.count))
+        elif event.kind == "remove":
+            for node in event.nodes:
+                if node not in self._seen:
+                    self._pool.remove(node)
+        elif event.kind == "reset":
+            self._pool = [node for node in self.playlist if node not in self._seen]
@@ -0,0 +1,23 @@
+import importlib
+
+
+# Stands in for a module and imports it the first time one of its
+# attributes is used.
+#
+# The players reach pygame through these, so importing a player (or
+# anything that only needs its playlists) does not load SDL; it is
+# imported when the mixer is first started.
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = "imported" if self._module else "not imported"
+        return f"<lazy module {self._name!r} ({state})>"
@@ -0,0 +1,174 @@
+import os
+import sqlite3
+from collections import namedtuple
+
+StoredSong = namedtuple("StoredSong", "song_id title artist path duration play_count")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    duration INTEGER NOT NULL DEFAULT 0,
+    play_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS songs_by_play_count ON songs (play_count);
+CREATE TABLE IF NOT EXISTS playlists (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS playlist_songs (
+    playlist_id INTEGER NOT NULL REFERENCES playlists(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    song_id INTEGER NOT NULL REFERENCES songs(id),
+    PRIMARY KEY (playlist_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS session (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def default_library_path():
+    return os.path.join(os.path.expanduser("~"), ".dsafy", "library.sqlite")
+
+
+# Songs, playlists, their order and play counts in a local SQLite file.
+#
+# Writes are grouped into one transaction per user action (a scanned batch,
+# a sort, a play), and the database runs in WAL mode so those commits are
+# cheap. Reads come back in pages so a playlist can be loaded as it is opened
+# instead of the whole library at startup.
+class LibraryStore:
+    def __init__(self, path=None):
+        self.path = path or default_library_path()
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def reader(self):
+        """A connection of its own to the same library, for a worker thread to read from"""
+        return LibraryStore(self.path)
+
+    # --- playlists ---------------------------------------------------------
+
+    def playlists(self):
+        """(playlist_id, name) pairs in display order"""
+        return self._db.execute("SELECT id, name FROM playlists ORDER BY position").fetchall()
+
+    def create_playlist(self, name):
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT INTO playlists (name, position) "
+                "VALUES (?, (SELECT COALESCE(MAX(position) + 1, 0) FROM playlists))", (name,))
+        return cursor.lastrowid
+
+    def save_playlist_order(self, playlist_ids):
+        with self._db:
+            self._db.executemany("UPDATE playlists SET position = ? WHERE id = ?",
+                                 [(position, pid) for position, pid in enumerate(playlist_ids)])
+
+    # --- songs -------------------------------------------------------------
+
+    def add_songs(self, playlist_id, songs):
+        """Append songs (anything with title/artist/path/duration) to a playlist.
+
+        Songs already known by path keep their row and play count. Returns
+        the song ids in the order given, all written in one transaction.
+        """
+        songs = list(songs)
+        with self._db:
+            self._db.executemany(
+                "INSERT INTO songs (path, title, artist, duration) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET title = excluded.title, "
+                "artist = excluded.artist, duration = excluded.duration",
+                [(s.path, s.title, s.artist, s.duration) for s in songs])
+            ids = self._song_ids([s.path for s in songs])
+            start = self._db.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM playlist_songs WHERE playlist_id = ?",
+                (playlist_id,)).fetchone()[0]
+            self._db.executemany(
+                "INSERT INTO playlist_songs (playlist_id, position, song_id) VALUES (?, ?, ?)",
+                [(playlist_id, start + i, ids[s.path]) for i, s in enumerate(songs)])
+        return [ids[s.path] for s in songs]
+
+    def _song_ids(self, paths):
+        ids = {}
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            rows = self._db.execute(
+                f"SELECT path, id FROM songs WHERE path IN ({','.join('?' * len(chunk))})", chunk)
+            ids.update(rows)
+        return ids
+
+    def library_songs(self):
+        """Every known song once, whichever playlists it is in"""
+        rows = self._db.execute("SELECT id, title, artist, path, duration, play_count FROM songs")
+        return [StoredSong(*row) for row in rows]
+
+    def library_paths(self):
+        """The path of every known song"""
+        return [path for path, in self._db.execute("SELECT path FROM songs")]
+
+    def count_songs(self, playlist_id):
+        return self._db.execute("SELECT COUNT(*) FROM playlist_songs WHERE playlist_id = ?",
+                                (playlist_id,)).fetchone()[0]
+
+    def page_songs(self, playlist_id, after_position=-1, limit=1000):
+        """One page of (position, StoredSong) rows following after_position"""
+        rows = self._db.execute(
+            "SELECT ps.position, s.id, s.title, s.artist, s.path, s.duration, s.play_count "
+            "FROM playlist_songs ps JOIN songs s ON s.id = ps.song_id "
+            "WHERE ps.playlist_id = ? AND ps.position > ? ORDER BY ps.position LIMIT ?",
+            (playlist_id, after_position, limit))
+        return [(row[0], StoredSong(*row[1:])) for row in rows]
+
+    def iter_songs(self, playlist_id, page_size=1000):
+        """Every song of a playlist in order, fetched a page at a time"""
+        position = -1
+        while True:
+            page = self.page_songs(playlist_id, position, page_size)
+            for position, song in page:
+                yield song
+            if len(page) < page_size:
+                return
+
+    def save_order(self, playlist_id, song_ids):
+        """Rewrite a playlist's order after a sort or shuffle"""
+        with self._db:
+            self._db.execute("DELETE FROM playlist_songs WHERE playlist_id = ?", (playlist_id,))
+            self._db.executemany(
+                "INSERT INTO playlist_songs (playlist_id, position, song_id) VALUES (?, ?, ?)",
+                [(playlist_id, position, sid) for position, sid in enumerate(song_ids)])
+
+    def top_songs(self, limit=10):
+        """The most played songs of the whole library, most played first"""
+        rows = self._db.execute(
+            "SELECT id, title, artist, path, duration, play_count FROM songs "
+            "WHERE play_count > 0 ORDER BY play_count DESC LIMIT ?", (limit,))
+        return [StoredSong(*row) for row in rows]
+
+    def record_play(self, song_id):
+        with self._db:
+            self._db.execute("UPDATE songs SET play_count = play_count + 1 WHERE id = ?", (song_id,))
+
+    # --- session -----------------------------------------------------------
+
+    def get_setting(self, key, default=None):
+        row = self._db.execute("SELECT value FROM session WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_setting(self, key, value):
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO session (key, value) VALUES (?, ?)",
+                             (key, None if value is None else str(value)))
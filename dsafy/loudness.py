@@ -0,0 +1,242 @@
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+import wave
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from dsafy.file_cache import FileCache, default_cache_path
+
+# gain is the dB change that brings a track to TARGET_DB, peak its largest
+# sample (full scale is 1.0); both None when the file could not be decoded
+Loudness = namedtuple("Loudness", "gain peak")
+
+UNKNOWN = Loudness(None, None)
+
+# Loudness every track is brought to, as RMS in dB below full scale
+TARGET_DB = -18.0
+# As in ReplayGain: mean square over 50 ms blocks, and the track's
+# loudness is the block at the 95th percentile, so quiet intros and
+# fades do not drag it down
+BLOCK_SECONDS = 0.05
+PERCENTILE = 95
+# WAV files are decoded this many frames at a time to bound memory
+CHUNK_FRAMES = 1 << 20
+
+
+def analyse(path):
+    """Loudness of one audio file, UNKNOWN if it cannot be decoded.
+
+    Needs NumPy; WAV is read with the wave module, anything else is
+    decoded by pygame into a sndarray.
+    """
+    try:
+        if path.lower().endswith(".wav"):
+            try:
+                return _measure(_wav_chunks(path))
+            except (wave.Error, ValueError):
+                # Compressed or 24-bit WAV: let pygame decode it
+                pass
+        return _measure(_decoded_chunks(path))
+    except (OSError, ValueError, MemoryError, RuntimeError, ImportError):
+        # pygame.error, for files SDL cannot decode, is a RuntimeError;
+        # without pygame only WAV files can be measured
+        return UNKNOWN
+
+
+def _wav_chunks(path):
+    import numpy as np
+
+    with wave.open(path, "rb") as w:
+        width = w.getsampwidth()
+        channels = w.getnchannels()
+        rate = w.getframerate()
+        if width not in (1, 2, 4):
+            raise ValueError(f"unsupported sample width {width}")
+        dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[width]
+        while True:
+            data = w.readframes(CHUNK_FRAMES)
+            if not data:
+                return
+            samples = np.frombuffer(data, dtype).reshape(-1, channels)
+            yield rate, _to_float(samples, width * 8, signed=width > 1)
+
+
+def _decoded_chunks(path):
+    import pygame.mixer
+    import pygame.sndarray
+
+    if not pygame.mixer.get_init():
+        pygame.mixer.init()
+    rate, size, channels = pygame.mixer.get_init()
+    samples = pygame.sndarray.array(pygame.mixer.Sound(path))
+    if samples.ndim == 1:
+        samples = samples.reshape(-1, 1)
+    yield rate, _to_float(samples, abs(size), signed=size < 0)
+
+
+def _to_float(samples, bits, signed):
+    import numpy as np
+
+    if samples.dtype.kind == "f":
+        return samples.astype(np.float32, copy=False)
+    scale = float(1 << (bits - 1))
+    samples = samples.astype(np.float32)
+    if not signed:
+        samples -= scale
+    samples /= scale
+    return samples
+
+
+def _measure(chunks):
+    import numpy as np
+
+    blocks = []
+    peak = 0.0
+    carry = None
+    for rate, samples in chunks:
+        if not len(samples):
+            continue
+        block = max(1, int(rate * BLOCK_SECONDS))
+        peak = max(peak, float(np.abs(samples).max()))
+        # Mean square per frame over all channels
+        power = np.square(samples, dtype=np.float64).mean(axis=1)
+        if carry is not None:
+            power = np.concatenate((carry, power))
+        usable = len(power) // block * block
+        carry = power[usable:]
+        if usable:
+            blocks.append(power[:usable].reshape(-1, block).mean(axis=1))
+    if not blocks:
+        return UNKNOWN
+    loudness = 10 * np.log10(np.percentile(np.concatenate(blocks), PERCENTILE) + 1e-10)
+    return Loudness(round(float(TARGET_DB - loudness), 2), round(peak, 4))
+
+
+def _init_worker():
+    # Decoding needs the mixer but never plays anything
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+
+# Loudness of each track, cached by file identity in ~/.dsafy/loudness.sqlite,
+# so a track is decoded once, not on every start
+class LoudnessCache(FileCache):
+    def __init__(self, path=None):
+        super().__init__(path or default_cache_path("loudness.sqlite"), "loudness",
+                         ("gain REAL", "peak REAL"), Loudness)
+
+
+# Works out a volume correction per track so songs play equally loud.
+#
+# Paths handed to analyse() are queued for one background thread, which
+# takes what it can from the cache and decodes the rest in a process pool,
+# so a large library is measured on every core without blocking the player.
+# gain() only reads what is known so far and answers 1.0 for the rest. When
+# NumPy is not installed nothing is analysed and every gain is 1.0.
+class LoudnessAnalyzer:
+    def __init__(self, cache=None, workers=None, batch_size=64):
+        self.cache = cache
+        self.workers = workers
+        self.batch_size = batch_size
+        # path -> Loudness for every track measured or found in the cache
+        self._known = {}
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._pool = None
+        self._closed = False
+
+    @property
+    def available(self):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def analyse(self, paths):
+        """Measure paths not known yet, on the background thread"""
+        paths = [path for path in paths if path not in self._known]
+        if not paths or self._closed or not self.available:
+            return
+        self._queue.put(paths)
+        self._start()
+
+    def analyse_from(self, read_paths):
+        """Measure the paths read_paths() returns, calling it on the background thread"""
+        if self._closed or not self.available:
+            return
+        self._queue.put(read_paths)
+        self._start()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="loudness", daemon=True)
+            self._thread.start()
+
+    def loudness(self, path):
+        return self._known.get(path, UNKNOWN)
+
+    def gain(self, path):
+        """Volume factor for path: 1.0 until it has been measured"""
+        gain, peak = self._known.get(path, UNKNOWN)
+        if gain is None:
+            return 1.0
+        factor = 10 ** (gain / 20)
+        if peak:
+            # Never raise a track above full scale
+            factor = min(factor, 1 / peak)
+        return factor
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        if self.cache:
+            self.cache.close()
+
+    def _run(self):
+        while True:
+            paths = self._queue.get()
+            if paths is None or self._closed:
+                return
+            if callable(paths):
+                try:
+                    paths = paths()
+                except (OSError, sqlite3.Error):
+                    continue
+            files = []
+            for path in paths:
+                if path in self._known:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((path, stat.st_size, stat.st_mtime))
+            if self.cache:
+                self._known.update(self.cache.lookup_many(files))
+            misses = [f for f in files if f[0] not in self._known]
+            for start in range(0, len(misses), self.batch_size):
+                if self._closed:
+                    return
+                self._measure_batch(misses[start:start + self.batch_size])
+
+    def _measure_batch(self, files):
+        if self._pool is None:
+            # Spawned, not forked: the player's mixer has SDL's audio thread
+            # running, and a forked child would inherit it half started
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker)
+        try:
+            measured = list(self._pool.map(analyse, [path for path, _, _ in files]))
+        except RuntimeError:
+            # Pool shut down by close()
+            return
+        for (path, _, _), loudness in zip(files, measured):
+            self._known[path] = loudness
+        if self.cache:
+            self.cache.store_many((path, size, mtime, loudness)
+                                  for (path, size, mtime), loudness in zip(files, measured))
@@ -0,0 +1,93 @@
+# Library-wide "most played" songs, kept up to date one play at a time.
+#
+# Holds only the current top k as a min-heap on play count, with a dict from
+# song key to heap slot so a song already in the top can be found and moved
+# after its count goes up. Play counts only ever grow, so every song outside
+# the heap has at most the heap minimum; a play can therefore only push a
+# song in by beating that minimum. Each play costs O(log k) and top() never
+# has to look at the rest of the library.
+class MostPlayed:
+    def __init__(self, k=10, key=lambda song: song.path):
+        self.k = k
+        self.key = key
+        # [play_count, key, song] entries; the least played of the top is at 0
+        self._heap = []
+        self._slots = {}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, song):
+        return self.key(song) in self._slots
+
+    def seed(self, songs):
+        """Start from songs that already have play counts, e.g. the store's top rows"""
+        for song in songs:
+            self.update(song, song.play_count)
+
+    def count(self, song, default=0):
+        slot = self._slots.get(self.key(song))
+        return self._heap[slot][0] if slot is not None else default
+
+    def played(self, song):
+        """Count one more play of song; returns True if the top changed"""
+        return self.update(song, self.count(song, song.play_count - 1) + 1)
+
+    def update(self, song, play_count):
+        """Set song's play count (never lower than before); returns True if the top changed"""
+        key = self.key(song)
+        heap = self._heap
+        slot = self._slots.get(key)
+        if slot is not None:
+            heap[slot][0] = play_count
+            heap[slot][2] = song
+            self._sift_down(slot)
+            return True
+        if len(heap) < self.k:
+            heap.append([play_count, key, song])
+            self._slots[key] = len(heap) - 1
+            self._sift_up(len(heap) - 1)
+            return True
+        if self.k and play_count > heap[0][0]:
+            del self._slots[heap[0][1]]
+            heap[0] = [play_count, key, song]
+            self._slots[key] = 0
+            self._sift_down(0)
+            return True
+        return False
+
+    def top(self):
+        """(song, play_count) pairs, most played first"""
+        entries = sorted(self._heap, key=lambda entry: entry[0], reverse=True)
+        return [(song, play_count) for play_count, key, song in entries]
+
+    def _sift_up(self, slot):
+        heap = self._heap
+        entry = heap[slot]
+        while slot:
+            parent = (slot - 1) >> 1
+            if heap[parent][0] <= entry[0]:
+                break
+            heap[slot] = heap[parent]
+            self._slots[heap[slot][1]] = slot
+            slot = parent
+        heap[slot] = entry
+        self._slots[entry[1]] = slot
+
+    def _sift_down(self, slot):
+        heap = self._heap
+        size = len(heap)
+        entry = heap[slot]
+        while True:
+            child = 2 * slot + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1][0] < heap[child][0]:
+                child += 1
+            if entry[0] <= heap[child][0]:
+                break
+            heap[slot] = heap[child]
+            self._slots[heap[slot][1]] = slot
+            slot = child
+        heap[slot] = entry
+        self._slots[entry[1]] = slot
@@ -0,0 +1,95 @@
+import queue
+import tkinter as tk
+
+# Virtual event that tells the Tk thread there are calls waiting for it
+CALLS_WAITING = "<<PlaybackCalls>>"
+
+
+# Notices the end of each track and runs the player's handler for it, all
+# on the Tk thread.
+#
+# pygame's events are read where SDL expects them, on the thread that
+# runs the window, by a root.after poll that only runs while something
+# plays: playing() starts it and idle() cancels it, so a paused or stopped
+# player does no periodic work. It checks every 100ms, as the players did
+# before, since that bounds the gap before a track that was not queued.
+#
+# The poll reads the mixer's end event, which also marks the start of a
+# queued track; if SDL's event queue cannot be started (no video driver at
+# all), it falls back to the mixer going quiet, which only sees the end of
+# the last track.
+#
+# Worker threads (prefetch reads, tag and duplicate scans) hand their
+# results to Tk through call_soon: the call is put on a queue and a virtual
+# event wakes the Tk loop to run it.
+class PlaybackController:
+    def __init__(self, root, end_event, on_track_end, poll_ms=100):
+        self.root = root
+        self.end_event = end_event
+        self.on_track_end = on_track_end
+        self.poll_ms = poll_ms
+        self._calls = queue.SimpleQueue()
+        self._active = False
+        self._closed = False
+        self._job = None
+        # Whether pygame's event queue could be started; None until first used
+        self._events = None
+        root.bind(CALLS_WAITING, self._run_calls, add="+")
+
+    def playing(self):
+        """Something is playing: watch for its end"""
+        self._active = True
+        if self._job is None and not self._closed:
+            self._job = self.root.after(self.poll_ms, self._poll)
+
+    def idle(self):
+        """Paused or stopped: stop watching until playing() is called again"""
+        self._active = False
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+
+    def close(self):
+        self._closed = True
+        self.idle()
+
+    def call_soon(self, func, *args):
+        """Run func(*args) on the Tk thread; safe to call from any thread"""
+        self._calls.put((func, args))
+        try:
+            self.root.event_generate(CALLS_WAITING, when="tail")
+        except (RuntimeError, tk.TclError):
+            # Tk is not running (yet, or any more); the queue is drained
+            # by the next event that does get through
+            pass
+
+    def _run_calls(self, event=None):
+        while True:
+            try:
+                func, args = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            func(*args)
+
+    def _poll(self):
+        self._job = None
+        for _ in range(self._ended()):
+            self.on_track_end()
+        if self._active and self._job is None and not self._closed:
+            self._job = self.root.after(self.poll_ms, self._poll)
+
+    def _ended(self):
+        """How many tracks ended since the last poll"""
+        import pygame
+
+        if self._events is None:
+            try:
+                # The event queue belongs to SDL's video subsystem, which
+                # mixer.init() leaves alone; no window is opened
+                pygame.display.init()
+                self._events = True
+            except pygame.error:
+                self._events = False
+        if self._events:
+            return len(pygame.event.get(self.end_event))
+        return 0 if pygame.mixer.music.get_busy() else 1
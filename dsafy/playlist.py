@@ -0,0 +1,406 @@
+"""Playlists of songs and the list of playlists, without any GUI or audio.
+
+The front-ends show and play these; scripts and benchmarks can use them
+without importing tkinter or pygame.
+"""
+import threading
+from operator import attrgetter
+
+from dsafy.catalog import Catalog
+from dsafy.fuzzy_index import FuzzyIndex
+from dsafy.indexed_list import IndexedList, IndexedNode
+from dsafy.most_played import MostPlayed
+from dsafy.playlist_io import batched, present, read_playlist, write_playlist
+from dsafy.search_index import SearchIndex
+from dsafy.sorted_index import SortedIndex
+
+
+def _record_keys(keys):
+    # Sort keys read straight off the record rather than through SongNode's properties
+    return attrgetter(*("record." + key for key in keys))
+
+
+# Song Node: one entry of a playlist, pointing at the catalog's record of
+# the song; the same record may be listed by many nodes
+class SongNode(IndexedNode):
+    __slots__ = ("record",)
+
+    def __init__(self, record):
+        super().__init__()
+        self.record = record
+
+    @property
+    def title(self):
+        return self.record.title
+
+    @property
+    def artist(self):
+        return self.record.artist
+
+    @property
+    def path(self):
+        return self.record.path
+
+    @property
+    def duration(self):
+        return self.record.duration
+
+    @property
+    def song_id(self):
+        return self.record.song_id
+
+    @property
+    def play_count(self):
+        return self.record.play_count
+
+    @play_count.setter
+    def play_count(self, value):
+        self.record.play_count = value
+
+
+# Song of a playlist that shares no catalog (a player with one playlist, a
+# cli job): with nothing to share, the fields are kept on the node and it
+# is its own record, which saves a SongRecord and a catalog entry per song
+class OwnSongNode(IndexedNode):
+    __slots__ = ("title", "artist", "path", "duration", "song_id", "play_count")
+
+    def __init__(self, title, artist, path, duration=0, song_id=None, play_count=0):
+        super().__init__()
+        self.title = title
+        self.artist = artist
+        self.path = path
+        self.duration = duration
+        self.song_id = song_id
+        self.play_count = play_count
+
+    @classmethod
+    def of(cls, song):
+        """A node with the fields of song (a node, a record, or anything with title/artist/path)"""
+        return cls(song.title, song.artist, song.path, getattr(song, "duration", 0),
+                   getattr(song, "song_id", None), getattr(song, "play_count", 0))
+
+    @property
+    def record(self):
+        return self
+
+# Playlist Node
+class PlaylistNode(IndexedNode):
+    __slots__ = ("name", "playlist_id", "store", "catalog", "_songs")
+
+    def __init__(self, name, playlist_id=None, store=None, loaded=True, catalog=None):
+        super().__init__()
+        self.name = name
+        self.playlist_id = playlist_id
+        self.store = store
+        self.catalog = catalog
+        self._songs = Playlist(catalog) if loaded else None
+
+    @property
+    def songs(self):
+        # Stored playlists are paged in from disk the first time they are used
+        if self._songs is None:
+            self._songs = Playlist(self.catalog)
+            self._songs.add_songs(self.store.iter_songs(self.playlist_id))
+        return self._songs
+
+# Doubly linked list for playlists
+class PlaylistManager(IndexedList):
+    def __init__(self, store=None):
+        super().__init__()
+        self.current_playlist = None
+        self.store = store
+        # One record per song, shared by every playlist that lists it
+        self.catalog = Catalog()
+        self.most_played = MostPlayed(10)
+        # Live "Top Songs" view of most_played, never saved to the store
+        self.top_playlist = None
+        # Every song by path; filled on a worker thread, so guarded by a lock
+        self.search_index = SearchIndex()
+        self.fuzzy_index = FuzzyIndex()
+        self._search_lock = threading.Lock()
+        self.search_playlist = None
+
+    def load(self):
+        """Read the playlist names of the last session; songs load on demand"""
+        self.most_played.seed(self.store.top_songs(self.most_played.k))
+        current_id = self.store.get_setting("current_playlist")
+        for playlist_id, name in self.store.playlists():
+            playlist = PlaylistNode(name, playlist_id, self.store, loaded=False, catalog=self.catalog)
+            self.append_node(playlist)
+            if str(playlist_id) == current_id:
+                self.current_playlist = playlist
+
+    def add_playlist(self, name):
+        playlist_id = self.store.create_playlist(name) if self.store else None
+        new_playlist = PlaylistNode(name, playlist_id, self.store, catalog=self.catalog)
+        self.append_node(new_playlist)
+        return new_playlist
+
+    def set_current(self, playlist):
+        self.current_playlist = playlist
+        if self.store:
+            self.store.set_setting("current_playlist", playlist.playlist_id)
+
+    def add_songs(self, playlist, songs):
+        """Append songs (anything with title/artist/path/duration) and save them in one go"""
+        songs = list(songs)
+        if self.store and playlist.playlist_id is not None:
+            song_ids = self.store.add_songs(playlist.playlist_id, songs)
+        else:
+            song_ids = [None] * len(songs)
+        records = [self.catalog.song(song.title, song.artist, song.path, song.duration, song_id)
+                   for song, song_id in zip(songs, song_ids)]
+        nodes = [SongNode(record) for record in records]
+        playlist.songs.extend_nodes(nodes)
+        with self._search_lock:
+            for record in records:
+                self.search_index.add(record.path, record, record.title, record.artist)
+                self.fuzzy_index.add(record.path, record, record.title, record.artist)
+        return nodes
+
+    def import_batches(self, playlist, path, report=None, batch_size=1000):
+        """Add the songs of an M3U, M3U8 or PLS file to playlist, a batch at a time.
+
+        A generator: it reads the file as it goes and yields the nodes added
+        by each batch, so it can be run to the end or stepped from the Tk
+        loop. Songs whose file is missing are left out and counted in report.
+        """
+        for batch in batched(present(read_playlist(path, report), report), batch_size):
+            yield self.add_songs(playlist, batch)
+
+    def export_playlist(self, playlist, path):
+        """Write playlist as M3U, M3U8 or PLS, as the extension of path says"""
+        return write_playlist(path, playlist.songs)
+
+    def find_duplicates(self, finder):
+        """Songs listed more than once, as the same file or the same audio.
+
+        Looks through every playlist (paging stored ones in) with a
+        dsafy.dedupe.DuplicateFinder and returns lists of (playlist, node)
+        pairs, one list per song; a list may span several playlists.
+        """
+        # dedupe brings in hashing, mmap, sqlite and the tag reader's process
+        # pool; only loaded when duplicates are looked for
+        from dsafy.dedupe import duplicate_songs
+
+        return duplicate_songs(self.all_songs(), finder)
+
+    def all_songs(self):
+        """(playlist, node) for every song of every playlist but Top Songs and Search Results"""
+        for playlist in self:
+            if playlist is not self.top_playlist and playlist is not self.search_playlist:
+                for node in playlist.songs:
+                    yield playlist, node
+
+    def collapse_duplicates(self, groups):
+        """Keep the first copy of each song in every playlist; returns how many were removed.
+
+        A song kept in several playlists stays in each of them.
+        """
+        from dsafy.dedupe import extra_copies
+
+        changed = set()
+        removed = 0
+        for playlist, node in extra_copies(groups):
+            songs = playlist.songs
+            if node not in songs:
+                # Removed since the duplicates were found
+                continue
+            if songs.current is node:
+                songs.current = None
+            songs.remove_node(node)
+            changed.add(playlist)
+            removed += 1
+        for playlist in changed:
+            self.save_order(playlist)
+        return removed
+
+    def record_play(self, song):
+        song.play_count += 1
+        if self.store and song.song_id is not None:
+            self.store.record_play(song.song_id)
+        if self.most_played.played(song):
+            self._refresh_top_playlist()
+        # The count is the record's: views sorted by it in other playlists
+        # (and other copies in this one) move the song too
+        for playlist in self:
+            if playlist._songs is not None:
+                playlist._songs.touch_record(song.record, skip=song)
+
+    def save_order(self, playlist):
+        if self.store and playlist.playlist_id is not None:
+            self.store.save_order(playlist.playlist_id, [song.song_id for song in playlist.songs])
+
+    def show_top_songs(self):
+        """The live Top Songs playlist, added to the list the first time it is asked for"""
+        if self.top_playlist is None:
+            self.top_playlist = PlaylistNode("Top Songs", catalog=self.catalog)
+            self.append_node(self.top_playlist)
+            self._refresh_top_playlist()
+        return self.top_playlist
+
+    def _refresh_top_playlist(self):
+        if self.top_playlist is not None:
+            self._replace_songs(self.top_playlist, [song for song, _ in self.most_played.top()])
+
+    def start_indexing(self):
+        """Index every stored song for search on a worker thread.
+
+        The stored rows are read on that thread too and indexed as they are;
+        a row only becomes a catalog record once it is shown in the search
+        results, so the catalog is only ever written from the Tk thread.
+        """
+        songs = None
+        if not self.store:
+            songs = list(self.catalog)
+        elif self.store.path == ":memory:":
+            # A second connection would open an empty database
+            songs = self.store.library_songs()
+        threading.Thread(target=self._index_songs, args=(songs,), name="search-index",
+                         daemon=True).start()
+
+    def _index_songs(self, songs=None):
+        if songs is None:
+            reader = self.store.reader()
+            try:
+                songs = reader.library_songs()
+            finally:
+                reader.close()
+        # Short lock holds so searches can run while the library is indexed
+        for start in range(0, len(songs), 1000):
+            with self._search_lock:
+                for song in songs[start:start + 1000]:
+                    # Songs added since the store was read are already in
+                    if song.path not in self.search_index:
+                        self.search_index.add(song.path, song, song.title, song.artist)
+                        self.fuzzy_index.add(song.path, song, song.title, song.artist)
+
+    def show_search_results(self, query, limit=500):
+        """Fill the Search Results playlist with songs matching query"""
+        with self._search_lock:
+            results = self.search_index.search(query, limit)
+            if len(results) < limit:
+                # Then songs that match with a typo or two ("beatls")
+                found = {song.path for song in results}
+                for song in self.fuzzy_index.search(query, limit):
+                    if song.path not in found and len(results) < limit:
+                        results.append(song)
+        if self.search_playlist is None:
+            self.search_playlist = PlaylistNode("Search Results", catalog=self.catalog)
+            self.append_node(self.search_playlist)
+        self._replace_songs(self.search_playlist, results)
+        return self.search_playlist
+
+    def _replace_songs(self, playlist, songs):
+        """Show songs in a playlist that is not saved; their play counts are the catalog's"""
+        songs_list = playlist.songs
+        # Reuse nodes of songs that stay so the current song survives
+        existing = {node.path: node for node in songs_list}
+        nodes = []
+        for song in songs:
+            node = existing.get(song.path)
+            if node is None:
+                node = SongNode(self.catalog.add(song))
+            nodes.append(node)
+        current = songs_list.current
+        songs_list.clear()
+        songs_list.extend_nodes(nodes)
+        songs_list.current = current if current in nodes else None
+
+    def shuffle_playlists(self):
+        self.shuffle_nodes()
+        self._save_playlist_order()
+
+    def sort_playlists_by(self, key):
+        self.sort_nodes(attrgetter(key))
+        self._save_playlist_order()
+
+    def _save_playlist_order(self):
+        if self.store:
+            self.store.save_playlist_order([playlist.playlist_id for playlist in self])
+
+# Doubly linked list for songs
+class Playlist(IndexedList):
+    def __init__(self, catalog=None):
+        super().__init__()
+        self.current = None
+        # The records its songs point at, shared with other playlists; without
+        # one each song is an OwnSongNode
+        self.catalog = catalog
+        self._views = {}
+        # record -> the nodes listing it, kept once a view sorts by play count
+        self._nodes_by_record = None
+
+    def add_song(self, title, artist, path, duration=0):
+        if self.catalog is None:
+            self.append_node(OwnSongNode(title, artist, path, duration))
+        else:
+            self.append_node(SongNode(self.catalog.song(title, artist, path, duration)))
+
+    def add_songs(self, songs):
+        if self.catalog is None:
+            self.extend_nodes(OwnSongNode.of(song) for song in songs)
+        else:
+            add = self.catalog.add
+            self.extend_nodes(SongNode(add(song)) for song in songs)
+
+    def _keys(self, keys):
+        # Fields are read off the record, or straight off an OwnSongNode
+        return attrgetter(*keys) if self.catalog is None else _record_keys(keys)
+
+    def touch_record(self, record, skip=None):
+        """Tell listeners that the entries of record, but skip, have changed.
+
+        Only a playlist with a view sorted by play count knows where a
+        record is listed; for any other this does nothing.
+        """
+        if self._nodes_by_record is None:
+            return
+        for node in self._nodes_by_record.get(record, ()):
+            if node is not skip:
+                self.touch(node)
+
+    def _follow_records(self):
+        self._nodes_by_record = {}
+        self._add_records(self)
+        self.subscribe(self._records_changed)
+
+    def _add_records(self, nodes):
+        for node in nodes:
+            self._nodes_by_record.setdefault(node.record, []).append(node)
+
+    def _records_changed(self, event):
+        if event.kind == "insert":
+            self._add_records(self.window(event.index, event.count))
+        elif event.kind == "remove":
+            for node in event.nodes:
+                nodes = self._nodes_by_record[node.record]
+                nodes.remove(node)
+                if not nodes:
+                    del self._nodes_by_record[node.record]
+        elif event.kind == "reset":
+            self._nodes_by_record.clear()
+            self._add_records(self)
+
+    def to_list(self):
+        return list(self)
+
+    def from_list(self, songs):
+        # With a catalog, nodes of songs already known point at the same records again
+        self.clear()
+        self.add_songs(songs)
+
+    def shuffle(self):
+        self.shuffle_nodes()
+
+    def sort_by(self, *keys, reverse=False):
+        self.sort_nodes(self._keys(keys), reverse)
+
+    def sorted_view(self, *keys, reverse=False):
+        """The songs ordered by keys, kept up to date without reordering the playlist"""
+        view = self._views.get((keys, reverse))
+        if view is None:
+            if "play_count" in keys and self._nodes_by_record is None:
+                self._follow_records()
+            view = self._views[keys, reverse] = SortedIndex(self, self._keys(keys), reverse)
+        return view
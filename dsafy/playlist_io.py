@@ -0,0 +1,283 @@
+import os
+from collections import OrderedDict, namedtuple
+from itertools import islice
+from urllib.parse import unquote, urlsplit
+
+# A song read from a playlist file; duration is whole seconds, 0 when unknown
+PlaylistEntry = namedtuple("PlaylistEntry", "path title artist duration")
+
+PLAYLIST_EXTENSIONS = (".m3u", ".m3u8", ".pls")
+
+
+# What an import did not bring in: lines that are not entries of the format,
+# and entries whose file is not there. Only the first few missing paths are
+# kept, so a broken million-line file does not fill memory.
+class ImportReport:
+    MAX_EXAMPLES = 100
+
+    def __init__(self):
+        self.entries = 0
+        self.skipped = 0
+        self.missing = 0
+        self.missing_paths = []
+
+    def add_missing(self, path):
+        self.missing += 1
+        if len(self.missing_paths) < self.MAX_EXAMPLES:
+            self.missing_paths.append(path)
+
+    def __str__(self):
+        return f"{self.entries} songs, {self.missing} missing, {self.skipped} lines skipped"
+
+
+def _resolver(base):
+    """Turn paths and file:// URLs as written in a playlist into local paths"""
+    base = os.path.abspath(base)
+    # Folder as written -> normalized absolute folder; songs come an album
+    # at a time, so each folder is normalized once rather than every path
+    folders = {}
+
+    def resolve(location):
+        if "://" in location:
+            url = urlsplit(location)
+            if url.scheme != "file":
+                # Streams are kept as they are; there is nothing to resolve
+                return location
+            location = unquote(url.path)
+            if os.name == "nt" and location[:1] == "/" and location[2:3] == ":":
+                location = location[1:]
+        if os.sep != "\\":
+            # Playlists written on Windows separate folders with backslashes
+            location = location.replace("\\", os.sep)
+        folder, sep, name = location.rpartition(os.sep)
+        folder += sep
+        resolved = folders.get(folder)
+        if resolved is None:
+            if len(folders) > 4096:
+                folders.clear()
+            # Plain string joins: nothing on disk is looked at
+            resolved = os.path.normpath(os.path.join(base, folder))
+            folders[folder] = resolved = resolved.rstrip(os.sep) + os.sep
+        return resolved + name
+
+    return resolve
+
+
+def _title_from_path(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _entry(path, info):
+    if info is None:
+        return PlaylistEntry(path, _title_from_path(path), "Unknown", 0)
+    duration, name = info
+    artist, sep, title = name.partition(" - ")
+    if not sep:
+        artist, title = "Unknown", name
+    return PlaylistEntry(path, title.strip() or _title_from_path(path), artist.strip() or "Unknown",
+                         max(duration, 0))
+
+
+def read_m3u(lines, base, report=None):
+    """Entries of an M3U or extended M3U (M3U8) playlist, one line at a time.
+
+    #EXTINF lines give the duration and "Artist - Title" of the path that
+    follows; other comments are ignored. Relative paths are taken from base.
+    """
+    resolve = _resolver(base)
+    info = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            if line.startswith("#EXTINF:"):
+                length, _, name = line[8:].partition(",")
+                try:
+                    # Attributes (tvg-id=... and the like) may follow the length
+                    info = (int(float(length.split()[0])), name.strip())
+                except (ValueError, IndexError, OverflowError):
+                    # No number, or one too large for a duration (inf, 1e400)
+                    info = None
+                    if report:
+                        report.skipped += 1
+            continue
+        entry = _entry(resolve(line), info)
+        info = None
+        if report:
+            report.entries += 1
+        yield entry
+
+
+def read_pls(lines, base, report=None):
+    """Entries of a PLS playlist, one line at a time.
+
+    Entries are numbered (File1, Title1, Length1, ...); each is given out
+    once the next number starts, so only entries whose keys are spread out
+    over the file are held back until the end.
+    """
+    resolve = _resolver(base)
+    pending = OrderedDict()
+    current = None
+
+    def finish(number):
+        fields = pending.pop(number)
+        if "file" not in fields:
+            if report:
+                report.skipped += 1
+            return None
+        title = fields.get("title")
+        info = (fields.get("length", 0), title) if title else None
+        entry = _entry(resolve(fields["file"]), info)
+        if info is None and fields.get("length", 0) > 0:
+            entry = entry._replace(duration=fields["length"])
+        if report:
+            report.entries += 1
+        return entry
+
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith(("[", ";", "#")):
+            continue
+        key, sep, value = line.partition("=")
+        key = key.strip().lower()
+        for field in ("file", "title", "length"):
+            if key.startswith(field) and key[len(field):].isdigit():
+                number = int(key[len(field):])
+                break
+        else:
+            # NumberOfEntries, Version and unknown keys
+            if not sep or key not in ("numberofentries", "version"):
+                if report:
+                    report.skipped += 1
+            continue
+        value = value.strip()
+        if field == "length":
+            try:
+                value = int(value)
+            except ValueError:
+                value = 0
+        if number != current and current in pending and "file" in pending[current]:
+            entry = finish(current)
+            if entry:
+                yield entry
+        current = number
+        pending.setdefault(number, {})[field] = value
+
+    for number in list(pending):
+        entry = finish(number)
+        if entry:
+            yield entry
+
+
+def read_playlist(path, report=None):
+    """Entries of an .m3u, .m3u8 or .pls file, read as they are needed"""
+    base = os.path.dirname(path)
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in PLAYLIST_EXTENSIONS:
+        raise ValueError(f"not a playlist file: {path}")
+    # surrogateescape keeps paths that are not valid UTF-8 usable as paths
+    with open(path, encoding="utf-8-sig", errors="surrogateescape") as f:
+        if extension == ".pls":
+            yield from read_pls(f, base, report)
+        else:
+            yield from read_m3u(f, base, report)
+
+
+def batched(entries, size):
+    """Lists of up to size entries"""
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, size))
+        if not batch:
+            return
+        yield batch
+
+
+# Tells which entries point at files that exist, listing each directory
+# once instead of stat-ing every file: a playlist usually holds whole
+# albums, so a few hundred listings cover tens of thousands of songs.
+# Listings are kept for the most recent directories only.
+class ExistingFiles:
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._listings = OrderedDict()
+
+    def __contains__(self, path):
+        if "://" in path:
+            return True
+        directory, name = os.path.split(path)
+        names = self._listings.get(directory)
+        if names is None:
+            try:
+                names = set(os.listdir(directory))
+            except OSError:
+                names = set()
+            self._listings[directory] = names
+            if len(self._listings) > self.capacity:
+                self._listings.popitem(last=False)
+        else:
+            self._listings.move_to_end(directory)
+        return name in names
+
+
+def present(entries, report=None, existing=None):
+    """The entries whose file exists; the others are counted in report"""
+    existing = existing if existing is not None else ExistingFiles()
+    for entry in entries:
+        if entry.path in existing:
+            yield entry
+        elif report:
+            report.add_missing(entry.path)
+
+
+def _relative(path, base):
+    # A prefix test instead of os.path.relpath, which normalizes both paths
+    # on every call; songs outside base keep their absolute path
+    if base and path.startswith(base):
+        return path[len(base):]
+    return path
+
+
+def write_m3u(path, songs, extended=True):
+    """Write songs (anything with path/title/artist/duration) as M3U, one line at a time.
+
+    Songs under the playlist's folder are written relative to it, so the
+    folder can be moved together with its playlist. Returns the count written.
+    """
+    base = os.path.join(os.path.abspath(os.path.dirname(path)), "")
+    count = 0
+    with open(path, "w", encoding="utf-8", errors="surrogateescape", newline="\n") as f:
+        if extended:
+            f.write("#EXTM3U\n")
+        for song in songs:
+            if extended:
+                duration = song.duration or -1
+                f.write(f"#EXTINF:{duration},{song.artist} - {song.title}\n")
+            f.write(_relative(song.path, base) + "\n")
+            count += 1
+    return count
+
+
+def write_pls(path, songs):
+    """Write songs as PLS; returns the count written"""
+    base = os.path.join(os.path.abspath(os.path.dirname(path)), "")
+    count = 0
+    with open(path, "w", encoding="utf-8", errors="surrogateescape", newline="\n") as f:
+        f.write("[playlist]\n")
+        for count, song in enumerate(songs, 1):
+            f.write(f"File{count}={_relative(song.path, base)}\n"
+                    f"Title{count}={song.artist} - {song.title}\n"
+                    f"Length{count}={song.duration or -1}\n")
+        f.write(f"NumberOfEntries={count}\nVersion=2\n")
+    return count
+
+
+def write_playlist(path, songs):
+    """Write songs in the format the extension of path names"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pls":
+        return write_pls(path, songs)
+    if extension in (".m3u", ".m3u8"):
+        return write_m3u(path, songs)
+    raise ValueError(f"not a playlist file: {path}")
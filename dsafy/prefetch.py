@@ -0,0 +1,68 @@
+import io
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+def _read(path, max_bytes):
+    if os.path.getsize(path) > max_bytes:
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# Reads upcoming tracks into memory on a background thread.
+#
+# The player asks for the next track as soon as the current one starts, so
+# by the time it ends the file is already in memory and pygame can queue it
+# from a BytesIO: no disk access on the Tk thread and no gap between tracks.
+# Only the last few requested files are kept; files larger than max_bytes
+# are left to be streamed from disk as before.
+class Prefetcher:
+    def __init__(self, capacity=2, max_bytes=256 * 2**20):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self._pool = ThreadPoolExecutor(1, thread_name_prefix="prefetch")
+        self._reads = OrderedDict()
+
+    def fetch(self, path, on_ready=None):
+        """Start reading path unless it is already read or on its way.
+
+        on_ready(path) is called from the reading thread once the read ends.
+        """
+        read = self._reads.get(path)
+        if read is not None:
+            self._reads.move_to_end(path)
+        else:
+            read = self._reads[path] = self._pool.submit(_read, path, self.max_bytes)
+        if on_ready:
+            read.add_done_callback(lambda read: read.cancelled() or on_ready(path))
+        while len(self._reads) > self.capacity:
+            self._reads.popitem(last=False)[1].cancel()
+
+    def ready(self, path):
+        """True once path is in memory and can be taken without waiting"""
+        read = self._reads.get(path)
+        return read is not None and read.done() and not read.cancelled() and read.exception() is None
+
+    def take(self, path, timeout=0):
+        """The prefetched file as a BytesIO, or None to load it from disk instead"""
+        read = self._reads.pop(path, None)
+        if read is None:
+            return None
+        try:
+            data = read.result(timeout)
+        except (TimeoutError, OSError):
+            return None
+        return io.BytesIO(data) if data is not None else None
+
+    def close(self):
+        for read in self._reads.values():
+            read.cancel()
+        self._reads.clear()
+        self._pool.shutdown(wait=False)
+
+
+def namehint(path):
+    """Format hint pygame needs when loading music from a file object"""
+    return os.path.splitext(path)[1].lstrip(".").lower()
@@ -0,0 +1,67 @@
+import time
+
+
+def parse_duration(value):
+    """Whole seconds from an int or an "m:ss" / "h:mm:ss" string, 0 when unknown"""
+    if isinstance(value, int):
+        return value
+    seconds = 0
+    try:
+        for part in value.split(":"):
+            seconds = seconds * 60 + int(part)
+    except (AttributeError, ValueError):
+        return 0
+    return seconds
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    if minutes >= 60:
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}:{minutes:02}:{seconds:02}"
+    return f"{minutes}:{seconds:02}"
+
+
+# Position of the track being played.
+#
+# Nothing counts seconds here: the position is worked out when asked for,
+# from the mixer's own playback position when there is one (source, e.g.
+# pygame's mixer.music.get_pos) and otherwise from a monotonic clock that
+# stops while paused. A timer that shows the position only has to redraw,
+# so it can run at a low rate and never drifts from what is heard.
+class PlaybackClock:
+    def __init__(self):
+        self._source = None
+        self._elapsed = 0.0
+        # When the clock last started or resumed, None while paused
+        self._since = None
+
+    @property
+    def running(self):
+        return self._since is not None
+
+    def start(self, source=None):
+        """A new track starts playing; source() returns milliseconds played, or -1"""
+        self._source = source
+        self._elapsed = 0.0
+        self._since = time.monotonic()
+
+    def pause(self):
+        if self._since is not None:
+            self._elapsed += time.monotonic() - self._since
+            self._since = None
+
+    def resume(self):
+        if self._since is None:
+            self._since = time.monotonic()
+
+    def position(self):
+        """Seconds played so far"""
+        if self._source is not None:
+            played = self._source()
+            if played >= 0:
+                return played / 1000
+        elapsed = self._elapsed
+        if self._since is not None:
+            elapsed += time.monotonic() - self._since
+        return elapsed
@@ -0,0 +1,143 @@
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".ogg")
+
+# duration stays 0 unless a TagReader fills it in
+ScannedFile = namedtuple("ScannedFile", "path title artist size mtime duration", defaults=(0,))
+
+ScanProgress = namedtuple("ScanProgress", "files directories errors elapsed rate done cancelled")
+
+
+def _scan_directory(directory, extensions, cancelled):
+    """List one directory: matching files plus the subdirectories to visit"""
+    files = []
+    subdirs = []
+    if cancelled.is_set():
+        return files, subdirs
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.lower().endswith(extensions):
+                    stat = entry.stat()
+                    title = os.path.splitext(entry.name)[0]
+                    files.append(ScannedFile(entry.path, title, "Unknown",
+                                             stat.st_size, stat.st_mtime))
+            except OSError:
+                continue
+    return files, subdirs
+
+
+# Walks music folders with os.scandir on a pool of worker threads, one task
+# per directory, and hands the files found to the UI in batches.
+#
+# Nothing here touches Tk: the UI calls drain() from root.after and inserts
+# each batch itself, so the event loop never blocks on the file system.
+class LibraryScanner:
+    def __init__(self, directories, extensions=AUDIO_EXTENSIONS, recursive=True,
+                 workers=8, batch_size=500, flush_interval=0.25, tag_reader=None):
+        self.directories = list(directories)
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.recursive = recursive
+        self.workers = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.tag_reader = tag_reader
+
+        self._batches = queue.Queue()
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._thread = None
+        self._started = None
+        self._finished = None
+        self.files = 0
+        self.directories_scanned = 0
+        self.errors = 0
+
+    def start(self):
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="library-scanner", daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def drain(self):
+        """Return every batch found since the last call, without blocking"""
+        batches = []
+        while True:
+            try:
+                batches.append(self._batches.get_nowait())
+            except queue.Empty:
+                return batches
+
+    def __iter__(self):
+        """Yield batches as they arrive until the scan ends (for headless use)"""
+        while True:
+            try:
+                yield self._batches.get(timeout=0.1)
+            except queue.Empty:
+                if self._done.is_set() and self._batches.empty():
+                    return
+
+    def progress(self):
+        end = self._finished or time.monotonic()
+        elapsed = end - self._started if self._started else 0.0
+        rate = self.files / elapsed if elapsed else 0.0
+        return ScanProgress(self.files, self.directories_scanned, self.errors, elapsed,
+                            rate, self._done.is_set(), self._cancelled.is_set())
+
+    def _run(self):
+        batch = []
+        last_flush = time.monotonic()
+        try:
+            with ThreadPoolExecutor(self.workers, thread_name_prefix="scan") as pool:
+                pending = {pool.submit(_scan_directory, d, self.extensions, self._cancelled)
+                           for d in self.directories}
+                while pending and not self._cancelled.is_set():
+                    finished, pending = wait(pending, timeout=self.flush_interval,
+                                             return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        try:
+                            files, subdirs = future.result()
+                        except OSError:
+                            self.errors += 1
+                            continue
+                        self.directories_scanned += 1
+                        if self.recursive:
+                            for subdir in subdirs:
+                                pending.add(pool.submit(_scan_directory, subdir,
+                                                        self.extensions, self._cancelled))
+                        batch.extend(files)
+                        self.files += len(files)
+
+                    now = time.monotonic()
+                    if len(batch) >= self.batch_size or (batch and now - last_flush >= self.flush_interval):
+                        self._flush(batch)
+                        batch = []
+                        last_flush = now
+
+                for future in pending:
+                    future.cancel()
+            if batch and not self._cancelled.is_set():
+                self._flush(batch)
+        finally:
+            self._finished = time.monotonic()
+            self._done.set()
+
+    def _flush(self, batch):
+        for start in range(0, len(batch), self.batch_size):
+            chunk = batch[start:start + self.batch_size]
+            if self.tag_reader:
+                chunk = self.tag_reader.resolve(chunk)
+            self._batches.put(chunk)
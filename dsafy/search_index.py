@@ -0,0 +1,121 @@
+import heapq
+import unicodedata
+
+
+def normalize(text):
+    """Case-fold and strip accents so "Beyoncé" and "beyonce" match"""
+    if text.isascii():
+        return text.casefold()
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _prefixes(text):
+    words = text.split()
+    return {word[:1] for word in words} | {word[:2] for word in words}
+
+
+# Search-as-you-type over song titles and artists.
+#
+# Two in-memory indexes answer a keystroke without scanning the library:
+# the top two levels of a character trie over every word, for queries of
+# one or two letters (word prefixes), and a trigram index for longer words,
+# which may match anywhere inside a title or artist. The trie stops at depth
+# two because longer words go to the trigrams; its nodes are kept flat in
+# one dict keyed by the prefix. Trigram hits are confirmed against the
+# normalized text, so results never contain false positives.
+#
+# Entries are added and removed one at a time, keyed by anything hashable
+# (the players use the file path, which is unique per song).
+class SearchIndex:
+    def __init__(self):
+        # key -> (item, normalized text)
+        self._docs = {}
+        # One and two letter word prefix -> keys
+        self._prefixes = {}
+        self._grams = {}
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, key):
+        return key in self._docs
+
+    def add(self, key, item, *fields):
+        """Index item under key by the given text fields, replacing an older entry"""
+        if key in self._docs:
+            self.remove(key)
+        text = " ".join(normalize(field) for field in fields if field)
+        self._docs[key] = (item, text)
+        for prefix in _prefixes(text):
+            self._prefixes.setdefault(prefix, set()).add(key)
+        for gram in _trigrams(text):
+            self._grams.setdefault(gram, set()).add(key)
+
+    def remove(self, key):
+        item, text = self._docs.pop(key)
+        for index, entries in ((self._prefixes, _prefixes(text)), (self._grams, _trigrams(text))):
+            for entry in entries:
+                keys = index[entry]
+                keys.discard(key)
+                if not keys:
+                    del index[entry]
+
+    def search(self, query, limit=100):
+        """Items matching every word of query, best matches first.
+
+        Words of one or two letters match the start of a word, longer ones
+        match anywhere. Songs whose text starts with the query come first,
+        then those with a word starting with it, then the rest by text.
+        """
+        query = normalize(query).strip()
+        words = query.split()
+        if not words:
+            return []
+
+        candidates = None
+        # The longest word usually narrows the candidates the most
+        for word in sorted(set(words), key=len, reverse=True):
+            if len(word) >= 3:
+                keys = self._substring_keys(word)
+            else:
+                keys = self._prefixes.get(word, set())
+            candidates = keys if candidates is None else candidates & keys
+            if not candidates:
+                return []
+
+        docs = self._docs
+        best = heapq.nsmallest(limit, candidates,
+                               key=lambda key: (_rank(docs[key][1], query), docs[key][1]))
+        return [docs[key][0] for key in best]
+
+    def _substring_keys(self, word):
+        postings = []
+        for gram in _trigrams(word):
+            keys = self._grams.get(gram)
+            if not keys:
+                return set()
+            postings.append(keys)
+        postings.sort(key=len)
+        keys = set(postings[0])
+        for other in postings[1:]:
+            keys &= other
+            if not keys:
+                return keys
+        if len(word) > 3:
+            # Trigrams can all be present without being adjacent
+            docs = self._docs
+            keys = {key for key in keys if word in docs[key][1]}
+        return keys
+
+
+def _rank(text, query):
+    if text.startswith(query):
+        return 0
+    if " " + query in text:
+        return 1
+    return 2
@@ -0,0 +1,178 @@
+from bisect import bisect_left, insort
+
+from dsafy.indexed_list import ChangeEvent
+
+# Entries per bucket before a bucket is split in two
+BUCKET_SIZE = 512
+
+
+# Songs of an IndexedList ordered by a key, kept next to the list's own order.
+#
+# The index follows the list's change events, so an added, removed or
+# replayed song costs one bisect into a bucket of at most 2 * BUCKET_SIZE
+# entries instead of a full sort. Switching the view to another ordering is
+# then just reading a different index, and the list itself keeps the order
+# songs were added in.
+#
+# Equal keys stay in the order the songs joined the index. A SortedIndex
+# offers the same read side as IndexedList (len, iteration, node_at,
+# index_of, window, subscribe), so views can show either one.
+class SortedIndex:
+    def __init__(self, model, key, reverse=False):
+        self.model = model
+        self.key = key
+        self.reverse = reverse
+        # Sorted buckets of (key, seq, node) entries; seq is unique so
+        # comparisons never reach the node
+        self._buckets = []
+        self._maxes = []
+        self._entries = {}
+        self._seq = 0
+        self._listeners = []
+        self._build()
+        model.subscribe(self.on_change)
+
+    def close(self):
+        """Stop following the list"""
+        self.model.unsubscribe(self.on_change)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        buckets = reversed(self._buckets) if self.reverse else self._buckets
+        for bucket in buckets:
+            for entry in (reversed(bucket) if self.reverse else bucket):
+                yield entry[2]
+
+    def subscribe(self, listener):
+        """Call listener(ChangeEvent) after every change to the ordering"""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def _notify(self, event):
+        for listener in list(self._listeners):
+            listener(event)
+
+    # --- following the list -----------------------------------------------
+
+    def on_change(self, event):
+        model = self.model
+        if event.kind == "insert":
+            for node in model.window(event.index, event.count):
+                self._add(node)
+        elif event.kind == "remove":
+            for node in event.nodes:
+                self._discard(node)
+        elif event.kind == "update":
+            # Keep the song's place among equal keys
+            node = model.node_at(event.index)
+            seq = self._discard(node)[1]
+            self._add(node, seq)
+        elif event.kind == "reset":
+            self._build()
+        else:
+            # A move or reorder of the list leaves every key as it was
+            return
+        self._notify(ChangeEvent("reset", 0, len(self)))
+
+    def _build(self):
+        sign = -1 if self.reverse else 1
+        entries = sorted((self.key(node), sign * seq, node) for seq, node in enumerate(self.model))
+        self._seq = len(entries)
+        self._entries = {entry[2]: entry for entry in entries}
+        self._buckets = [entries[i:i + BUCKET_SIZE] for i in range(0, len(entries), BUCKET_SIZE)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+
+    def _add(self, node, seq=None):
+        if seq is None:
+            # Negated when reversed, so equal keys still read oldest first
+            seq = -self._seq if self.reverse else self._seq
+            self._seq += 1
+        entry = (self.key(node), seq, node)
+        self._entries[node] = entry
+        if not self._buckets:
+            self._buckets.append([entry])
+            self._maxes.append(entry)
+            return
+
+        i = bisect_left(self._maxes, entry)
+        if i == len(self._buckets):
+            i -= 1
+        bucket = self._buckets[i]
+        insort(bucket, entry)
+        self._maxes[i] = bucket[-1]
+        if len(bucket) > 2 * BUCKET_SIZE:
+            self._buckets[i:i + 1] = [bucket[:BUCKET_SIZE], bucket[BUCKET_SIZE:]]
+            self._maxes[i:i + 1] = [bucket[BUCKET_SIZE - 1], bucket[-1]]
+
+    def _discard(self, node):
+        entry = self._entries.pop(node)
+        i = bisect_left(self._maxes, entry)
+        bucket = self._buckets[i]
+        del bucket[bisect_left(bucket, entry)]
+        if bucket:
+            self._maxes[i] = bucket[-1]
+        else:
+            del self._buckets[i]
+            del self._maxes[i]
+        return entry
+
+    # --- positional access ------------------------------------------------
+
+    def _locate(self, index):
+        """(bucket number, offset) of ascending position index"""
+        for i, bucket in enumerate(self._buckets):
+            if index < len(bucket):
+                return i, index
+            index -= len(bucket)
+        raise IndexError("playlist index out of range")
+
+    def node_at(self, index):
+        size = len(self)
+        if index < 0:
+            index += size
+        if index < 0 or index >= size:
+            raise IndexError("playlist index out of range")
+        if self.reverse:
+            index = size - 1 - index
+        i, j = self._locate(index)
+        return self._buckets[i][j][2]
+
+    def index_of(self, node):
+        entry = self._entries.get(node)
+        if entry is None:
+            raise ValueError("node is not in this playlist")
+        i = bisect_left(self._maxes, entry)
+        index = bisect_left(self._buckets[i], entry)
+        for bucket in self._buckets[:i]:
+            index += len(bucket)
+        return len(self) - 1 - index if self.reverse else index
+
+    def window(self, start, count):
+        """Up to count nodes from position start"""
+        nodes = []
+        if start >= len(self) or count <= 0:
+            return nodes
+        step = -1 if self.reverse else 1
+        i, j = self._locate(len(self) - 1 - start if self.reverse else start)
+        buckets = self._buckets
+        while len(nodes) < count and 0 <= i < len(buckets):
+            bucket = buckets[i]
+            while len(nodes) < count and 0 <= j < len(bucket):
+                nodes.append(bucket[j][2])
+                j += step
+            i += step
+            if 0 <= i < len(buckets):
+                j = 0 if step > 0 else len(buckets[i]) - 1
+        return nodes
+
+    def node_after(self, node):
+        index = self.index_of(node) + 1
+        return self.node_at(index) if index < len(self) else None
+
+    def node_before(self, node):
+        index = self.index_of(node)
+        return self.node_at(index - 1) if index else None
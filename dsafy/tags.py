@@ -0,0 +1,454 @@
+import multiprocessing
+import os
+import struct
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from dsafy.file_cache import FileCache, default_cache_path
+
+# duration is whole seconds, 0 when the headers do not say
+Tags = namedtuple("Tags", "title artist album duration")
+
+EMPTY_TAGS = Tags(None, None, None, 0)
+
+# Vorbis comment packets can carry cover art; never read more than this
+MAX_HEADER_BYTES = 1 << 20
+
+_ID3_TEXT_FRAMES = {
+    b"TIT2": "title", b"TT2": "title",
+    b"TPE1": "artist", b"TP1": "artist",
+    b"TALB": "album", b"TAL": "album",
+    b"TLEN": "length", b"TLE": "length",
+}
+
+_ID3_ENCODINGS = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}
+
+# MPEG audio bitrates in kbit/s, indexed [version is MPEG-1][layer][index]
+_MP3_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def read_tags(path):
+    """Read title, artist, album and duration from the file headers.
+
+    Only the bytes needed are read: the ID3v2 tag and first audio frame,
+    the RIFF chunk headers, the Ogg/FLAC header packets, plus the last
+    128 bytes (ID3v1) or the last Ogg page (duration). Unknown or broken
+    files give EMPTY_TAGS rather than an error.
+    """
+    try:
+        with open(path, "rb") as f:
+            magic = f.read(12)
+            f.seek(0)
+            if magic.startswith(b"RIFF") and magic[8:12] == b"WAVE":
+                return _read_riff(f)
+            if magic.startswith(b"OggS"):
+                return _read_ogg(f)
+            if magic.startswith(b"fLaC"):
+                return _read_flac(f)
+            return _read_mp3(f)
+    except (OSError, ValueError, struct.error, IndexError):
+        return EMPTY_TAGS
+
+
+def _file_size(f):
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    return size
+
+
+# --- MP3 ----------------------------------------------------------------------
+
+def _synchsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _decode_id3_text(data):
+    if not data:
+        return None
+    encoding = _ID3_ENCODINGS.get(data[0], "latin-1")
+    text = data[1:].decode(encoding, errors="replace")
+    # Multiple values are NUL separated, keep the first
+    return text.split("\x00")[0].strip() or None
+
+
+def _read_id3v2(f):
+    """Parse an ID3v2 tag at the start of the file; returns (fields, tag length)"""
+    header = f.read(10)
+    if len(header) < 10 or not header.startswith(b"ID3"):
+        f.seek(0)
+        return {}, 0
+    major, flags = header[3], header[5]
+    length = _synchsafe(header[6:10])
+    total = 10 + length + (10 if flags & 0x10 else 0)
+    data = f.read(min(length, MAX_HEADER_BYTES))
+    if flags & 0x80 and major < 4:
+        data = data.replace(b"\xff\x00", b"\xff")
+
+    pos = 0
+    if flags & 0x40:
+        ext_size = struct.unpack(">I", data[:4])[0]
+        pos = _synchsafe(data[:4]) if major >= 4 else ext_size + 4
+
+    fields = {}
+    id_len, size_len, header_len = (3, 3, 6) if major == 2 else (4, 4, 10)
+    while pos + header_len <= len(data):
+        frame_id = data[pos:pos + id_len]
+        if not frame_id.strip(b"\x00"):
+            break
+        raw_size = data[pos + id_len:pos + id_len + size_len]
+        if major == 2:
+            size = int.from_bytes(raw_size, "big")
+        elif major >= 4:
+            size = _synchsafe(raw_size)
+        else:
+            size = struct.unpack(">I", raw_size)[0]
+        body = data[pos + header_len:pos + header_len + size]
+        name = _ID3_TEXT_FRAMES.get(frame_id)
+        if name and name not in fields:
+            fields[name] = _decode_id3_text(body)
+        pos += header_len + size
+    f.seek(total)
+    return fields, total
+
+
+def _read_id3v1(f, size):
+    if size < 128:
+        return {}
+    f.seek(size - 128)
+    block = f.read(128)
+    if not block.startswith(b"TAG"):
+        return {}
+
+    def text(raw):
+        return raw.split(b"\x00")[0].decode("latin-1").strip() or None
+
+    return {"title": text(block[3:33]), "artist": text(block[33:63]), "album": text(block[63:93])}
+
+
+def _mp3_duration(f, audio_start, audio_end):
+    """Seconds from the first frame: Xing/Info/VBRI frame count, else CBR size"""
+    f.seek(audio_start)
+    data = f.read(4096)
+    sync = 0
+    while True:
+        sync = data.find(b"\xff", sync)
+        if sync < 0 or sync + 4 > len(data):
+            return 0
+        if data[sync + 1] & 0xE0 == 0xE0:
+            break
+        sync += 1
+
+    b1, b2, b3 = data[sync + 1], data[sync + 2], data[sync + 3]
+    version = (b1 >> 3) & 0x03
+    layer = 4 - ((b1 >> 1) & 0x03)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x03
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return 0
+    mpeg1 = version == 3
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    bitrate = _MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    mono = (b3 >> 6) == 3
+    if layer == 1:
+        samples = 384
+    elif layer == 3 and not mpeg1:
+        samples = 576
+    else:
+        samples = 1152
+
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    xing = sync + 4 + side_info
+    frames = None
+    if data[xing:xing + 4] in (b"Xing", b"Info"):
+        if struct.unpack(">I", data[xing + 4:xing + 8])[0] & 0x1:
+            frames = struct.unpack(">I", data[xing + 8:xing + 12])[0]
+    elif data[sync + 36:sync + 40] == b"VBRI":
+        frames = struct.unpack(">I", data[sync + 50:sync + 54])[0]
+
+    if frames:
+        return int(frames * samples / sample_rate)
+    return int((audio_end - audio_start - sync) * 8 / bitrate)
+
+
+def _read_mp3(f):
+    size = _file_size(f)
+    fields, audio_start = _read_id3v2(f)
+    trailer = _read_id3v1(f, size)
+    audio_end = size - 128 if trailer else size
+    for name, value in trailer.items():
+        if not fields.get(name):
+            fields[name] = value
+
+    duration = 0
+    length = fields.get("length")
+    if length and length.isdigit():
+        duration = int(length) // 1000
+    if not duration:
+        duration = _mp3_duration(f, audio_start, audio_end)
+    return Tags(fields.get("title"), fields.get("artist"), fields.get("album"), duration)
+
+
+# --- RIFF / WAVE ----------------------------------------------------------------
+
+def _read_riff(f):
+    f.seek(12)
+    fields = {}
+    byte_rate = 0
+    data_size = 0
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        chunk_id, chunk_size = header[:4], struct.unpack("<I", header[4:])[0]
+        padded = chunk_size + (chunk_size & 1)
+        if chunk_id == b"fmt ":
+            fmt = f.read(chunk_size)
+            byte_rate = struct.unpack("<I", fmt[8:12])[0]
+            f.seek(padded - chunk_size, os.SEEK_CUR)
+        elif chunk_id == b"data":
+            data_size = chunk_size
+            f.seek(padded, os.SEEK_CUR)
+        elif chunk_id == b"LIST" and chunk_size <= MAX_HEADER_BYTES:
+            body = f.read(padded)
+            if body.startswith(b"INFO"):
+                fields.update(_parse_riff_info(body[4:chunk_size]))
+        else:
+            f.seek(padded, os.SEEK_CUR)
+
+    duration = data_size // byte_rate if byte_rate else 0
+    return Tags(fields.get("title"), fields.get("artist"), fields.get("album"), duration)
+
+
+def _parse_riff_info(body):
+    names = {b"INAM": "title", b"IART": "artist", b"IPRD": "album"}
+    fields = {}
+    pos = 0
+    while pos + 8 <= len(body):
+        sub_id, sub_size = body[pos:pos + 4], struct.unpack("<I", body[pos + 4:pos + 8])[0]
+        value = body[pos + 8:pos + 8 + sub_size].split(b"\x00")[0]
+        if sub_id in names:
+            fields[names[sub_id]] = value.decode("utf-8", errors="replace").strip() or None
+        pos += 8 + sub_size + (sub_size & 1)
+    return fields
+
+
+# --- Vorbis comments (Ogg, FLAC) -------------------------------------------------
+
+def _parse_vorbis_comment(data):
+    names = {"TITLE": "title", "ARTIST": "artist", "ALBUM": "album"}
+    fields = {}
+    vendor_length = struct.unpack("<I", data[:4])[0]
+    pos = 4 + vendor_length
+    count = struct.unpack("<I", data[pos:pos + 4])[0]
+    pos += 4
+    for _ in range(count):
+        if pos + 4 > len(data):
+            break
+        length = struct.unpack("<I", data[pos:pos + 4])[0]
+        comment = data[pos + 4:pos + 4 + length].decode("utf-8", errors="replace")
+        pos += 4 + length
+        key, _, value = comment.partition("=")
+        name = names.get(key.upper())
+        if name and name not in fields:
+            fields[name] = value.strip() or None
+    return fields
+
+
+def _ogg_packets(f, wanted):
+    """Reassemble the first `wanted` packets from Ogg pages"""
+    packets = []
+    partial = b""
+    read = 0
+    while len(packets) < wanted and read < MAX_HEADER_BYTES:
+        header = f.read(27)
+        if len(header) < 27 or not header.startswith(b"OggS"):
+            break
+        lacing = f.read(header[26])
+        body = f.read(sum(lacing))
+        read += 27 + len(lacing) + len(body)
+        pos = 0
+        for segment in lacing:
+            partial += body[pos:pos + segment]
+            pos += segment
+            if segment < 255:
+                packets.append(partial)
+                partial = b""
+    return packets
+
+
+def _read_ogg(f):
+    size = _file_size(f)
+    packets = _ogg_packets(f, 2)
+    fields = {}
+    sample_rate = 0
+    if packets and packets[0].startswith(b"\x01vorbis"):
+        sample_rate = struct.unpack("<I", packets[0][12:16])[0]
+    elif packets and packets[0].startswith(b"OpusHead"):
+        sample_rate = 48000
+    if len(packets) > 1:
+        if packets[1].startswith(b"\x03vorbis"):
+            fields = _parse_vorbis_comment(packets[1][7:])
+        elif packets[1].startswith(b"OpusTags"):
+            fields = _parse_vorbis_comment(packets[1][8:])
+
+    duration = 0
+    if sample_rate:
+        # The last page's granule position is the total sample count
+        f.seek(max(0, size - 65536))
+        tail = f.read()
+        last = tail.rfind(b"OggS")
+        if last >= 0 and last + 14 <= len(tail):
+            granule = struct.unpack("<q", tail[last + 6:last + 14])[0]
+            duration = max(0, granule) // sample_rate
+    return Tags(fields.get("title"), fields.get("artist"), fields.get("album"), duration)
+
+
+def _read_flac(f):
+    f.seek(4)
+    fields = {}
+    duration = 0
+    while True:
+        header = f.read(4)
+        if len(header) < 4:
+            break
+        last, block_type = header[0] & 0x80, header[0] & 0x7F
+        length = int.from_bytes(header[1:4], "big")
+        if block_type == 0:
+            info = f.read(length)
+            sample_rate = int.from_bytes(info[10:13], "big") >> 4
+            total_samples = int.from_bytes(info[13:18], "big") & 0xFFFFFFFFF
+            if sample_rate:
+                duration = total_samples // sample_rate
+        elif block_type == 4 and length <= MAX_HEADER_BYTES:
+            fields = _parse_vorbis_comment(f.read(length))
+        else:
+            f.seek(length, os.SEEK_CUR)
+        if last:
+            break
+    return Tags(fields.get("title"), fields.get("artist"), fields.get("album"), duration)
+
+
+# --- audio payload ----------------------------------------------------------------
+
+def audio_span(path):
+    """(start, end) byte offsets of the audio data in a file, tags left out.
+
+    Covers ID3v2, ID3v1 and APEv2 around MP3 audio, the data chunk of a
+    WAV file and the frames after FLAC's metadata blocks. Ogg files keep
+    their comments in the header pages and other files are not understood,
+    so for those the whole file is the span.
+    """
+    with open(path, "rb") as f:
+        size = _file_size(f)
+        head = f.read(12)
+        if head.startswith(b"RIFF") and head[8:12] == b"WAVE":
+            return _riff_span(f, size)
+        if head.startswith(b"fLaC"):
+            return _flac_span(f, size)
+        if head.startswith(b"OggS"):
+            return 0, size
+        return _mp3_span(f, head, size)
+
+
+def _mp3_span(f, head, size):
+    start = 0
+    if head.startswith(b"ID3") and len(head) >= 10:
+        start = 10 + _synchsafe(head[6:10]) + (10 if head[5] & 0x10 else 0)
+    end = size
+    if end - start >= 128:
+        f.seek(end - 128)
+        if f.read(3) == b"TAG":
+            end -= 128
+    if end - start >= 32:
+        f.seek(end - 32)
+        footer = f.read(32)
+        if footer.startswith(b"APETAGEX"):
+            # The size counts the items and footer; a header may come first
+            length, flags = struct.unpack("<I4xI", footer[12:24])
+            end -= length + (32 if flags & 0x80000000 else 0)
+    start = min(start, size)
+    return start, max(start, end)
+
+
+def _riff_span(f, size):
+    position = 12
+    while position + 8 <= size:
+        f.seek(position)
+        header = f.read(8)
+        chunk_id, chunk_size = header[:4], struct.unpack("<I", header[4:])[0]
+        if chunk_id == b"data":
+            return position + 8, min(position + 8 + chunk_size, size)
+        position += 8 + chunk_size + (chunk_size & 1)
+    return 0, size
+
+
+def _flac_span(f, size):
+    position = 4
+    while position + 4 <= size:
+        f.seek(position)
+        header = f.read(4)
+        position += 4 + int.from_bytes(header[1:4], "big")
+        if header[0] & 0x80:
+            return min(position, size), size
+    return 0, size
+
+
+# --- cache ------------------------------------------------------------------------
+
+# Tags of each file, cached by file identity in ~/.dsafy/tags.sqlite, so a
+# rescan of an unchanged file costs only the stat the scanner already did
+class TagCache(FileCache):
+    def __init__(self, path=None):
+        super().__init__(path or default_cache_path("tags.sqlite"), "tags",
+                         ("title TEXT", "artist TEXT", "album TEXT", "duration INTEGER"), Tags)
+
+
+# Fills in ScannedFile titles and artists from tags: cached entries first,
+# then the misses in a process pool (inline for a handful of files, where
+# starting processes would cost more than it saves).
+class TagReader:
+    def __init__(self, cache=None, workers=None, pool_threshold=64):
+        self.cache = cache
+        self.workers = workers
+        self.pool_threshold = pool_threshold
+        self._pool = None
+
+    def resolve(self, files):
+        cached = self.cache.lookup_many((f.path, f.size, f.mtime) for f in files) if self.cache else {}
+        misses = [f for f in files if f.path not in cached]
+        paths = [f.path for f in misses]
+        if len(paths) >= self.pool_threshold:
+            if self._pool is None:
+                # Spawned, not forked, so no child inherits the player's SDL audio thread
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            read = list(self._pool.map(read_tags, paths, chunksize=32))
+        else:
+            read = [read_tags(path) for path in paths]
+        if self.cache and misses:
+            self.cache.store_many((f.path, f.size, f.mtime, tags) for f, tags in zip(misses, read))
+
+        tags_by_path = dict(cached)
+        tags_by_path.update(zip(paths, read))
+        return [_apply_tags(f, tags_by_path[f.path]) for f in files]
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown()
+            self._pool = None
+        if self.cache:
+            self.cache.close()
+
+
+def _apply_tags(scanned, tags):
+    return scanned._replace(title=tags.title or scanned.title,
+                            artist=tags.artist or scanned.artist,
+                            duration=tags.duration or scanned.duration)
@@ -0,0 +1,77 @@
+# Keeps a Tk Listbox in step with an IndexedList by applying its change
+# events, so adding or removing one song costs one or two Tk calls instead
+# of clearing and refilling every row.
+#
+# Only the widget passed in is used; this module does not import tkinter.
+class ListboxBinding:
+    def __init__(self, listbox, model=None, format=lambda node: node.title):
+        self.listbox = listbox
+        self.format = format
+        self.model = None
+        self._highlighted = None
+        self._highlight_row = None
+        self._highlight_options = {}
+        self.set_model(model)
+
+    def set_model(self, model):
+        """Show a different list, e.g. when another playlist is selected"""
+        if self.model is not None:
+            self.model.unsubscribe(self.on_change)
+        self.model = model
+        self._highlighted = self._highlight_row = None
+        if model is not None:
+            model.subscribe(self.on_change)
+        self.refresh()
+
+    def refresh(self):
+        self.listbox.delete(0, "end")
+        if self.model is not None and len(self.model):
+            self.listbox.insert("end", *[self.format(node) for node in self.model])
+        self._apply_highlight()
+
+    def on_change(self, event):
+        listbox = self.listbox
+        if event.kind == "insert":
+            nodes = self.model.window(event.index, event.count)
+            listbox.insert(event.index, *[self.format(node) for node in nodes])
+        elif event.kind == "remove":
+            listbox.delete(event.index, event.index + event.count - 1)
+        elif event.kind == "update":
+            self._replace_row(event.index, event.index)
+        elif event.kind == "move":
+            self._replace_row(event.old_index, event.index)
+        else:
+            self.refresh()
+            return
+        self._apply_highlight()
+
+    def _replace_row(self, old_index, new_index):
+        selected = self.listbox.selection_includes(old_index)
+        self.listbox.delete(old_index)
+        self.listbox.insert(new_index, self.format(self.model.node_at(new_index)))
+        if selected:
+            self.listbox.selection_set(new_index)
+
+    def highlight(self, node, **options):
+        """Mark node's row with itemconfig options, clearing the previous mark"""
+        self._highlighted = node
+        if options:
+            self._highlight_options = options
+        self._apply_highlight()
+
+    def _apply_highlight(self):
+        listbox = self.listbox
+        if self._highlight_row is not None and self._highlight_row < listbox.size():
+            listbox.itemconfig(self._highlight_row, **{key: "" for key in self._highlight_options})
+        self._highlight_row = None
+        node = self._highlighted
+        if node is None or self.model is None:
+            return
+        try:
+            row = self.model.index_of(node)
+        except ValueError:
+            # The highlighted song was removed
+            self._highlighted = None
+            return
+        listbox.itemconfig(row, **self._highlight_options)
+        self._highlight_row = row
@@ -0,0 +1,191 @@
+import tkinter as tk
+import tkinter.font as tkfont
+from tkinter import ttk
+
+
+# Scrolling list that only holds the rows currently on screen.
+#
+# The Listbox inside never has more than a screenful of items: scrolling
+# moves a window over the model (an IndexedList) and refills it with
+# model.window(top, rows), an O(log n) lookup plus one step per visible row.
+# Opening or scrolling a playlist therefore costs the same whether it holds
+# a hundred songs or a million. The scrollbar is driven by hand from the
+# model's length.
+#
+# It accepts the Listbox calls the players use (bind, curselection,
+# selection_set, selection_clear, see) with positions in the whole list.
+class VirtualList(tk.Frame):
+    def __init__(self, master, model=None, format=lambda node: node.title, height=15,
+                 **listbox_options):
+        super().__init__(master, bg=listbox_options.get("bg", None))
+        self.format = format
+        self.model = None
+        self.top = 0
+        self.rows = height
+        self._shown = []
+        self._selected = None
+        self._highlighted = None
+        self._highlight_options = {}
+
+        self.listbox = tk.Listbox(self, height=height, **listbox_options)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        font = tkfont.Font(font=self.listbox.cget("font"))
+        self._row_height = font.metrics("linespace") + 2 * int(self.listbox.cget("selectborderwidth"))
+        self.listbox.bind("<Configure>", self._on_resize)
+        self.listbox.bind("<MouseWheel>", self._on_wheel)
+        self.listbox.bind("<Button-4>", lambda event: self._scroll_by(-3))
+        self.listbox.bind("<Button-5>", lambda event: self._scroll_by(3))
+        self.listbox.bind("<Up>", lambda event: self._step(-1))
+        self.listbox.bind("<Down>", lambda event: self._step(1))
+        self.set_model(model)
+
+    def set_model(self, model):
+        """Show a different list, e.g. when another playlist is selected"""
+        if self.model is not None:
+            self.model.unsubscribe(self.on_change)
+        self.model = model
+        self.top = 0
+        self._selected = self._highlighted = None
+        if model is not None:
+            model.subscribe(self.on_change)
+        self.refresh()
+
+    def _size(self):
+        return len(self.model) if self.model is not None else 0
+
+    # --- drawing -----------------------------------------------------------
+
+    def refresh(self):
+        self._remember_selection()
+        listbox = self.listbox
+        listbox.delete(0, tk.END)
+        self.top = max(0, min(self.top, self._size() - self.rows))
+        self._shown = self.model.window(self.top, self.rows + 1) if self.model is not None else []
+        if self._shown:
+            listbox.insert(tk.END, *[self.format(node) for node in self._shown])
+        listbox.yview_moveto(0)
+
+        row = self._row_of(self._selected)
+        if row is not None:
+            listbox.selection_set(row)
+        row = self._row_of(self._highlighted)
+        if row is not None:
+            listbox.itemconfig(row, **self._highlight_options)
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        size = self._size()
+        if size <= self.rows:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.top / size, (self.top + self.rows) / size)
+
+    def _row_of(self, node):
+        """Listbox row showing node, or None when it is scrolled out of view"""
+        if node is None:
+            return None
+        for row, shown in enumerate(self._shown):
+            if shown is node:
+                return row
+        return None
+
+    def _remember_selection(self):
+        # Clicks select Listbox rows directly; keep the node so the
+        # selection survives scrolling it out of view and back
+        selection = self.listbox.curselection()
+        if selection and selection[0] < len(self._shown):
+            self._selected = self._shown[selection[0]]
+
+    def on_change(self, event):
+        end = self.top + len(self._shown)
+        if event.kind in ("insert", "remove") and event.index >= end and len(self._shown) > self.rows:
+            # Past the bottom of the screen, only the scrollbar moves
+            self._update_scrollbar()
+            return
+        if event.kind == "insert" and event.index < self.top:
+            self.top += event.count
+        elif event.kind == "remove" and event.index < self.top:
+            self.top = max(event.index, self.top - event.count)
+        self.refresh()
+
+    def highlight(self, node, **options):
+        """Mark node's row with itemconfig options, clearing the previous mark"""
+        self._highlighted = node
+        if options:
+            self._highlight_options = options
+        self.refresh()
+
+    # --- scrolling ---------------------------------------------------------
+
+    def yview(self, *args):
+        size = self._size()
+        if args[0] == "moveto":
+            top = int(float(args[1]) * size)
+        elif args[2] == "pages":
+            top = self.top + int(args[1]) * self.rows
+        else:
+            top = self.top + int(args[1])
+        self._scroll_to(top)
+
+    def _scroll_to(self, top):
+        top = max(0, min(top, self._size() - self.rows))
+        if top != self.top:
+            self._remember_selection()
+            self.top = top
+            self.refresh()
+
+    def _scroll_by(self, rows):
+        self._scroll_to(self.top + rows)
+        return "break"
+
+    def _on_wheel(self, event):
+        return self._scroll_by(-3 if event.delta > 0 else 3)
+
+    def _step(self, delta):
+        selection = self.curselection()
+        index = selection[0] + delta if selection else self.top
+        if 0 <= index < self._size():
+            self.selection_clear()
+            self.selection_set(index)
+            self.see(index)
+            self.listbox.event_generate("<<ListboxSelect>>")
+        return "break"
+
+    def _on_resize(self, event):
+        rows = max(1, event.height // self._row_height)
+        if rows != self.rows:
+            self.rows = rows
+            self.refresh()
+
+    # --- Listbox-style access by position in the whole list ----------------
+
+    def bind(self, sequence=None, func=None, add=None):
+        return self.listbox.bind(sequence, func, add)
+
+    def curselection(self):
+        selection = self.listbox.curselection()
+        if selection and selection[0] < len(self._shown):
+            return (self.top + selection[0],)
+        if self._selected is not None:
+            try:
+                return (self.model.index_of(self._selected),)
+            except ValueError:
+                self._selected = None
+        return ()
+
+    def selection_clear(self, first=0, last=None):
+        self._selected = None
+        self.listbox.selection_clear(0, tk.END)
+
+    def selection_set(self, index):
+        self._selected = self.model.node_at(index)
+        row = index - self.top
+        if 0 <= row < len(self._shown):
+            self.listbox.selection_set(row)
+
+    def see(self, index):
+        if not self.top <= index < self.top + self.rows:
+            self._scroll_to(index - self.rows // 2)
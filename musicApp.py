@@ -3,9 +3,11 @@ from tkinter import *
 from tkinter import filedialog
 import customtkinter as ctk
 import os
+from dsafy.scanner import LibraryScanner
 
 
 class Song:
+    __slots__ = ("title", "artist", "duration", "playcount")
 
     def __init__(self, title, artist, duration, playcount):
         self.title = title
@@ -17,6 +19,7 @@ class Song:
         return f"{self.title} - {self.artist} ({self.duration})"
 
 class DNode:
+    __slots__ = ("song", "next", "previous")
     
     def __init__(self,song):
         self.song= song
@@ -69,22 +72,32 @@ def create_sort_dropdown(root):
 songs = []
 currentSong = ""
 paused = False
+scanner = None
 
 def loadMusic():
-    global currentSong
+    global scanner
     root.directory = filedialog.askdirectory()
+    if not root.directory:
+        return
 
-    for song in os.listdir(root.directory):
-        song_name, extn=os.path.splitext(song)
-        if extn == ".mp3" or extn == ".WAV":
-            songs.append(song)
-
-    for i in songs:
-        songList.insert("end",song)
+    # List the folder on a worker thread and add what it finds in batches
+    if scanner:
+        scanner.cancel()
+    scanner = LibraryScanner([root.directory], extensions=(".mp3", ".wav"), recursive=False).start()
+    root.after(100, pollScanner)
 
-
-    songList.selection_set(0)
-    currentSong = songs[songList.curselection()[0]]
+def pollScanner():
+    global currentSong
+    progress = scanner.progress()
+    for batch in scanner.drain():
+        names = [os.path.basename(found.path) for found in batch]
+        songs.extend(names)
+        songList.insert("end", "".join(name + "\n" for name in names))
+
+    if songs and not currentSong:
+        currentSong = songs[0]
+    if not progress.done:
+        root.after(100, pollScanner)
 
 
 
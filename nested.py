@@ -1,141 +1,69 @@
 import os
-import random
+import threading
 import tkinter as tk
+from contextlib import ExitStack
 from tkinter import filedialog, messagebox, simpledialog
-from pygame import mixer, USEREVENT
-
-# Song Node
-class SongNode:
-    def __init__(self, title, artist, path):
-        self.title = title
-        self.artist = artist
-        self.path = path
-        self.play_count = 0
-        self.prev = None
-        self.next = None
-
-# Playlist Node
-class PlaylistNode:
-    def __init__(self, name):
-        self.name = name
-        self.songs = Playlist()
-        self.prev = None
-        self.next = None
-
-# Doubly linked list for playlists
-class PlaylistManager:
-    def __init__(self):
-        self.head = None
-        self.tail = None
-        self.current_playlist = None
-        self.size = 0
-
-    def add_playlist(self, name):
-        new_playlist = PlaylistNode(name)
-        if not self.head:
-            self.head = self.tail = new_playlist
-        else:
-            new_playlist.prev = self.tail
-            self.tail.next = new_playlist
-            self.tail = new_playlist
-        self.size += 1
-        return new_playlist
-
-    def get_all_songs(self):
-        all_songs = []
-        current = self.head
-        while current:
-            song_node = current.songs.head
-            while song_node:
-                all_songs.append(song_node)
-                song_node = song_node.next
-            current = current.next
-        return all_songs
-
-    def shuffle_playlists(self):
-        playlists = []
-        current = self.head
-        while current:
-            playlists.append(current)
-            current = current.next
-        random.shuffle(playlists)
-        self._rebuild_playlists(playlists)
-
-    def sort_playlists_by(self, key):
-        playlists = []
-        current = self.head
-        while current:
-            playlists.append(current)
-            current = current.next
-        playlists.sort(key=lambda x: getattr(x, key))
-        self._rebuild_playlists(playlists)
-
-    def _rebuild_playlists(self, playlists):
-        self.head = None
-        self.tail = None
-        for pl in playlists:
-            if not self.head:
-                self.head = pl
-            else:
-                pl.prev = self.tail
-                self.tail.next = pl
-            self.tail = pl
-
-# Doubly linked list for songs
-class Playlist:
-    def __init__(self):
-        self.head = None
-        self.tail = None
-        self.current = None
-        self.size = 0
-
-    def add_song(self, title, artist, path):
-        new_node = SongNode(title, artist, path)
-        if not self.head:
-            self.head = self.tail = new_node
-        else:
-            new_node.prev = self.tail
-            self.tail.next = new_node
-            self.tail = new_node
-        self.size += 1
-
-    def to_list(self):
-        songs = []
-        current = self.head
-        while current:
-            songs.append(current)
-            current = current.next
-        return songs
-
-    def from_list(self, songs):
-        self.head = None
-        self.tail = None
-        self.size = 0
-        for song in songs:
-            self.add_song(song.title, song.artist, song.path)
-
-    def shuffle(self):
-        songs = self.to_list()
-        random.shuffle(songs)
-        self.from_list(songs)
-
-    def sort_by(self, key):
-        songs = self.to_list()
-        songs.sort(key=lambda x: getattr(x, key))
-        self.from_list(songs)
+from dsafy.dedupe import DuplicateFinder, HashCache, duplicate_songs, extra_copies
+from dsafy.history import PlaylistHistory
+from dsafy.lazy import LazyModule
+from dsafy.library_store import LibraryStore
+from dsafy.loudness import LoudnessAnalyzer, LoudnessCache
+from dsafy.playback import PlaybackController
+from dsafy.playlist import PlaylistManager
+from dsafy.playlist_io import ImportReport
+from dsafy.prefetch import Prefetcher, namehint
+from dsafy.scanner import LibraryScanner
+from dsafy.tags import TagCache, TagReader
+from dsafy.views import ListboxBinding
+from dsafy.virtual_list import VirtualList
+
+# pygame is imported when the player starts its mixer, not with this module
+pygame = LazyModule("pygame")
+mixer = LazyModule("pygame.mixer")
 
 # Music Player Application
 class MusicPlayer:
+    # Orderings offered by Sort; anything else shows the playlist's own order
+    SONG_ORDERS = {
+        "Title": ("title",),
+        "Artist": ("artist", "title"),
+        "Play Count": ("play_count",)
+    }
+
     def __init__(self, root):
         self.root = root
         self.root.title("Advanced Music Player")
-        self.playlists = PlaylistManager()
+        self.store = LibraryStore()
+        self.playlists = PlaylistManager(self.store)
         self.current_playlist = None
         self.paused = False
+        self.shuffle_order = None
+        self.scanner = None
+        self.tag_reader = TagReader(TagCache())
+        self.duplicate_finder = DuplicateFinder(HashCache())
+        self.prefetcher = Prefetcher()
+        # Measures tracks in the background so each plays at the same loudness
+        self.loudness = LoudnessAnalyzer(LoudnessCache())
+        self.volume = 0.5
+        self.playing_path = None
+        # Song lined up after the one playing, the playlist it belongs to,
+        # and whether pygame has it queued
+        self.upcoming = None
+        self.upcoming_songs = None
+        self.queued = False
+        # Whether pygame holds a queued file at all; after the order changes
+        # it can be one lined up before, which pygame cannot take back
+        self.queue_pending = False
+        self.scan_target = None
+        # Undo history of each playlist's song order, from when it was first shown
+        self.histories = {}
+        self.song_order = self.store.get_setting("song_order", "Playlist order")
 
         mixer.init()
-        self.SONG_END_EVENT = USEREVENT + 1
+        self.SONG_END_EVENT = pygame.USEREVENT + 1
         mixer.music.set_endevent(self.SONG_END_EVENT)
+        # Polls for track ends from the Tk loop while playing; nothing runs while idle
+        self.playback = PlaybackController(self.root, self.SONG_END_EVENT, self.track_ended)
 
         self.create_menu()
         self.create_playlist_box()
@@ -144,21 +72,53 @@ class MusicPlayer:
         self.create_volume_control()
         self.create_status_bar()
 
-        self.root.after(100, self.check_music_end)
+        # Show the window first, then bring back the last session
+        self.root.after_idle(self.restore_session)
+
+    def restore_session(self):
+        self.playlists.load()
+        self.playlists.start_indexing()
+        self.loudness.analyse_from(self.library_paths)
+        current = self.playlists.current_playlist
+        if current:
+            index = self.playlists.index_of(current)
+            self.playlist_box.selection_set(index)
+            self.playlist_box.see(index)
+            self.update_song_display()
+
+    def library_paths(self):
+        # Called on the loudness thread, so it reads through a connection of its own
+        reader = self.store.reader()
+        try:
+            return reader.library_paths()
+        finally:
+            reader.close()
 
     def create_menu(self):
         menubar = tk.Menu(self.root)
         file_menu = tk.Menu(menubar, tearoff=0)
         file_menu.add_command(label="New Playlist", command=self.create_playlist)
         file_menu.add_command(label="Add Songs", command=self.add_songs)
+        file_menu.add_command(label="Stop Adding", command=self.cancel_scan)
+        file_menu.add_separator()
+        file_menu.add_command(label="Import Playlist...", command=self.import_playlist)
+        file_menu.add_command(label="Export Playlist...", command=self.export_playlist)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
         menubar.add_cascade(label="File", menu=file_menu)
         
+        edit_menu = tk.Menu(menubar, tearoff=0)
+        edit_menu.add_command(label="Undo", accelerator="Ctrl+Z", command=self.undo)
+        edit_menu.add_command(label="Redo", accelerator="Ctrl+Y", command=self.redo)
+        menubar.add_cascade(label="Edit", menu=edit_menu)
+        self.root.bind("<Control-z>", self.undo)
+        self.root.bind("<Control-y>", self.redo)
+        
         playlist_menu = tk.Menu(menubar, tearoff=0)
         playlist_menu.add_command(label="Shuffle Playlists", command=self.shuffle_playlists)
         playlist_menu.add_command(label="Sort Playlists", command=self.sort_playlist_menu)
         playlist_menu.add_command(label="Create Top Songs", command=self.create_top_playlist)
+        playlist_menu.add_command(label="Find Duplicates", command=self.find_duplicates)
         menubar.add_cascade(label="Playlists", menu=playlist_menu)
         
         self.root.config(menu=menubar)
@@ -171,13 +131,20 @@ class MusicPlayer:
         self.playlist_box = tk.Listbox(self.playlist_frame, width=20, height=15)
         self.playlist_box.pack()
         self.playlist_box.bind('<<ListboxSelect>>', self.select_playlist)
+        self.playlist_view = ListboxBinding(self.playlist_box, self.playlists,
+                                            format=lambda playlist: playlist.name)
 
     def create_song_box(self):
         self.song_frame = tk.Frame(self.root)
         self.song_frame.pack(side=tk.RIGHT, padx=10, pady=10)
         
         tk.Label(self.song_frame, text="Songs").pack()
-        self.song_box = tk.Listbox(self.song_frame, width=40, height=15)
+        # Search as you type across every playlist
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", self.search_songs)
+        self.before_search = None
+        tk.Entry(self.song_frame, textvariable=self.search_var, width=40).pack()
+        self.song_box = VirtualList(self.song_frame, width=40, height=15)
         self.song_box.pack()
         self.song_box.bind('<<ListboxSelect>>', self.select_song)  # Fixed method name
 
@@ -191,6 +158,9 @@ class MusicPlayer:
         next_btn = tk.Button(control_frame, text=">>", command=self.next_song)
         shuffle_btn = tk.Button(control_frame, text="Shuffle", command=self.shuffle_songs)
         sort_btn = tk.Button(control_frame, text="Sort", command=self.sort_song_menu)
+        self.shuffle_play = tk.BooleanVar(value=False)
+        shuffle_play_btn = tk.Checkbutton(control_frame, text="Shuffle Play", variable=self.shuffle_play,
+                                          command=self.toggle_shuffle_play)
 
         prev_btn.grid(row=0, column=0, padx=5)
         play_btn.grid(row=0, column=1, padx=5)
@@ -198,13 +168,14 @@ class MusicPlayer:
         next_btn.grid(row=0, column=3, padx=5)
         shuffle_btn.grid(row=0, column=4, padx=5)
         sort_btn.grid(row=0, column=5, padx=5)
+        shuffle_play_btn.grid(row=0, column=6, padx=5)
 
     def create_playlist(self):
         name = simpledialog.askstring("New Playlist", "Enter playlist name:")
         if name:
             new_pl = self.playlists.add_playlist(name)
-            self.playlist_box.insert(tk.END, name)
-            self.playlists.current_playlist = new_pl
+            self.playlists.set_current(new_pl)
+            self.update_song_display()
 
     def add_songs(self):
         if not self.playlists.current_playlist:
@@ -212,26 +183,95 @@ class MusicPlayer:
             return
             
         directory = filedialog.askdirectory()
-        valid_extensions = ['.mp3', '.wav', '.ogg']
-        
-        for root_dir, _, files in os.walk(directory):
-            for file in files:
-                if any(file.endswith(ext) for ext in valid_extensions):
-                    path = os.path.join(root_dir, file)
-                    title = os.path.splitext(file)[0]
-                    self.playlists.current_playlist.songs.add_song(title, "Unknown", path)
-        
+        if not directory:
+            return
+
+        # Scan on worker threads and pick up the results from the Tk loop.
+        # Songs go to the playlist chosen now, even if the user switches away.
+        self.cancel_scan()
+        self.scan_target = self.playlists.current_playlist
+        self.scanner = LibraryScanner([directory], tag_reader=self.tag_reader).start()
+        self.root.after(100, self.poll_scanner)
+
+    def poll_scanner(self):
+        if not self.scanner:
+            return
+        # Read progress first: once done is seen, every batch is queued
+        progress = self.scanner.progress()
+        for batch in self.scanner.drain():
+            self.playlists.add_songs(self.scan_target, batch)
+            self.loudness.analyse(song.path for song in batch)
+
+        if progress.done:
+            self.status_var.set(f"Added {progress.files} songs to {self.scan_target.name} "
+                                f"in {progress.elapsed:.1f}s")
+            self.scanner = None
+        else:
+            self.status_var.set(f"Scanning... {progress.files} songs ({progress.rate:.0f} files/s)")
+            self.root.after(100, self.poll_scanner)
+
+    def import_playlist(self):
+        path = filedialog.askopenfilename(filetypes=[("Playlists", "*.m3u *.m3u8 *.pls")])
+        if not path:
+            return
+        name = os.path.splitext(os.path.basename(path))[0]
+        playlist = self.playlists.add_playlist(name)
+        self.playlists.set_current(playlist)
         self.update_song_display()
+        # One batch per turn of the Tk loop, so the window stays responsive
+        # however long the file is
+        report = ImportReport()
+        batches = self.playlists.import_batches(playlist, path, report)
+        # The whole import is one step of Undo, however many batches it takes
+        history = self.song_history()
+        history.begin_batch()
+        self.root.after_idle(self.step_import, playlist, batches, report, history)
+
+    def step_import(self, playlist, batches, report, history):
+        nodes = None
+        try:
+            nodes = next(batches)
+        except StopIteration:
+            self.status_var.set(f"Imported {playlist.name}: {report}")
+        except (OSError, ValueError) as error:
+            messagebox.showerror("Import failed", str(error))
+        finally:
+            if nodes is None:
+                # Finished or failed: what was added becomes one version
+                history.end_batch()
+        if nodes is None:
+            return
+        self.loudness.analyse(song.path for song in nodes)
+        self.status_var.set(f"Importing {playlist.name}... {report.entries} songs read")
+        self.root.after_idle(self.step_import, playlist, batches, report, history)
+
+    def export_playlist(self):
+        playlist = self.playlists.current_playlist
+        if not playlist:
+            messagebox.showerror("Error", "No playlist selected")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".m3u8", initialfile=playlist.name,
+                                            filetypes=[("M3U8", "*.m3u8"), ("M3U", "*.m3u"), ("PLS", "*.pls")])
+        if not path:
+            return
+        try:
+            count = self.playlists.export_playlist(playlist, path)
+        except (OSError, ValueError) as error:
+            messagebox.showerror("Export failed", str(error))
+            return
+        self.status_var.set(f"Exported {count} songs to {os.path.basename(path)}")
+
+    def cancel_scan(self):
+        if self.scanner:
+            self.scanner.cancel()
 
     def select_playlist(self, event):
         selection = self.playlist_box.curselection()
         if not selection:
             return
         index = selection[0]
-        current = self.playlists.head
-        for _ in range(index):
-            current = current.next
-        self.playlists.current_playlist = current
+        self.playlists.set_current(self.playlists.node_at(index))
+        self.reset_shuffle_order()
         self.update_song_display()
 
     def select_song(self, event):  # Added missing method
@@ -242,51 +282,175 @@ class MusicPlayer:
             index = selection[0]
             self.play_song(index)
 
+    def search_songs(self, *args):
+        query = self.search_var.get()
+        current = self.playlists.current_playlist
+        if query.strip():
+            results = self.playlists.show_search_results(query)
+            if current is not results:
+                self.before_search = current
+                self.playlists.set_current(results)
+                self.reset_shuffle_order()
+                self.update_song_display()
+        elif self.before_search is not None:
+            # Cleared the box: back to the playlist that was open
+            self.playlists.set_current(self.before_search)
+            self.before_search = None
+            self.reset_shuffle_order()
+            self.update_song_display()
+
+    def song_view(self):
+        """The current playlist in the order picked under Sort"""
+        songs = self.playlists.current_playlist.songs
+        keys = self.SONG_ORDERS.get(self.song_order)
+        return songs.sorted_view(*keys) if keys else songs
+
     def update_song_display(self):
-        self.song_box.delete(0, tk.END)
-        if not self.playlists.current_playlist:
-            return
-        current = self.playlists.current_playlist.songs.head
-        while current:
-            self.song_box.insert(tk.END, current.title)
-            current = current.next
+        current = self.playlists.current_playlist
+        self.song_box.set_model(self.song_view() if current else None)
+        self.song_history()
+
+    def song_history(self):
+        """History of the current playlist, kept from the first time it is shown"""
+        playlist = self.playlists.current_playlist
+        # Top Songs and Search Results are rebuilt all the time and never saved
+        if playlist is None or playlist in (self.playlists.top_playlist, self.playlists.search_playlist):
+            return None
+        history = self.histories.get(playlist)
+        if history is None:
+            history = self.histories[playlist] = PlaylistHistory(playlist.songs)
+        return history
+
+    def history_batch(self):
+        """Context manager that makes the changes to every playlist one step of Undo each"""
+        stack = ExitStack()
+        for history in self.histories.values():
+            stack.enter_context(history.batch())
+        return stack
+
+    def undo(self, event=None):
+        history = self.song_history()
+        if history and history.undo():
+            self.order_restored()
+        else:
+            self.status_var.set("Nothing to undo")
+
+    def redo(self, event=None):
+        history = self.song_history()
+        if history and history.redo():
+            self.order_restored()
+        else:
+            self.status_var.set("Nothing to redo")
+
+    def order_restored(self):
+        songs = self.playlists.current_playlist.songs
+        self.playlists.save_order(self.playlists.current_playlist)
+        self.reset_shuffle_order()
+        if self.upcoming_songs is songs:
+            # The song after the current one may be gone or elsewhere now
+            self.upcoming = None
+            self.queued = False
+            self.prepare_next(songs)
+        self.update_song_display()
 
     def play_song(self, index=None):
         if not self.playlists.current_playlist:
             return
             
         songs = self.playlists.current_playlist.songs
+        view = self.song_view()
         if index is not None:
-            current = songs.head
-            for _ in range(index):
-                current = current.next
-            songs.current = current
-        else:
-            songs.current = songs.head
+            songs.current = view.node_at(index)
+        elif not songs.current and len(view):
+            songs.current = view.node_at(0)
 
         if songs.current:
-            mixer.music.load(songs.current.path)
+            path = songs.current.path
+            data = self.prefetcher.take(path)
+            if data:
+                mixer.music.load(data, namehint(path))
+            else:
+                mixer.music.load(path)
+            # Loading drops whatever pygame had queued
+            self.queue_pending = False
             mixer.music.play()
-            songs.current.play_count += 1
-            self.status_var.set(f"Now Playing: {songs.current.title}")
-            self.paused = False
+            self.playback.playing()
+            self.song_started(songs)
+
+    def song_started(self, songs):
+        self.playlists.record_play(songs.current)
+        songs.touch(songs.current)
+        self.status_var.set(f"Now Playing: {songs.current.title}")
+        self.paused = False
+        self.playing_path = songs.current.path
+        self.apply_volume()
+        self.prepare_next(songs)
+
+    def pick_next(self, songs):
+        if songs is not self.playlists.current_playlist.songs:
+            # Still playing a playlist the user has since switched away from
+            return songs.node_after(songs.current) if songs.current else None
+        if self.shuffle_order:
+            return next(self.shuffle_order, None)
+        return self.song_view().node_after(songs.current) if songs.current else None
+
+    def prepare_next(self, songs):
+        """Choose the following song now and start reading it into memory"""
+        self.queued = False
+        self.upcoming_songs = songs
+        self.upcoming = self.pick_next(songs)
+        if self.upcoming:
+            self.prefetcher.fetch(self.upcoming.path,
+                                  lambda path: self.playback.call_soon(self.queue_upcoming, path))
+
+    def check_upcoming(self, current):
+        """Line up the next song again if current (as it was) or the one after it was taken out"""
+        songs = self.upcoming_songs
+        if songs is None:
+            return
+        if current not in songs or (self.upcoming and self.upcoming not in songs):
+            self.upcoming = None
+            self.queued = False
+            self.prepare_next(songs)
 
     def create_top_playlist(self):
-        all_songs = self.playlists.get_all_songs()
-        all_songs.sort(key=lambda x: -x.play_count)
-        top_songs = all_songs[:10]  # Top 10 songs
-        
-        new_pl = self.playlists.add_playlist("Top Songs")
-        for song in top_songs:
-            new_pl.songs.add_song(song.title, song.artist, song.path)
-            
-        self.playlist_box.insert(tk.END, "Top Songs")
-        self.playlists.current_playlist = new_pl
+        # Kept up to date by every play, nothing to rebuild here
+        top_songs = self.playlists.show_top_songs()
+        self.playlists.set_current(top_songs)
         self.update_song_display()
 
+    def find_duplicates(self):
+        # Songs are gathered here (stored playlists page in from the store);
+        # reading and hashing the files runs on a worker thread
+        entries = list(self.playlists.all_songs())
+        self.status_var.set(f"Looking for duplicates among {len(entries)} songs...")
+        threading.Thread(target=self._find_duplicates, args=(entries,), name="dedupe", daemon=True).start()
+
+    def _find_duplicates(self, entries):
+        groups = duplicate_songs(entries, self.duplicate_finder)
+        self.playback.call_soon(self.show_duplicates, groups)
+
+    def show_duplicates(self, groups):
+        if not groups:
+            self.status_var.set("No duplicates found")
+            return
+        extra = len(extra_copies(groups))
+        examples = "\n".join(" / ".join(f"{playlist.name}: {node.title}" for playlist, node in group[:3])
+                             for group in groups[:10])
+        self.status_var.set(f"{len(groups)} songs are listed more than once")
+        if extra and messagebox.askyesno(
+                "Duplicates", f"{len(groups)} songs are listed more than once, for example:\n\n{examples}"
+                f"\n\nRemove the {extra} extra copies within playlists?"):
+            songs = self.upcoming_songs
+            current = songs.current if songs else None
+            with self.history_batch():
+                removed = self.playlists.collapse_duplicates(groups)
+            self.check_upcoming(current)
+            self.update_song_display()
+            self.status_var.set(f"Removed {removed} duplicate songs")
+
     def shuffle_playlists(self):
         self.playlists.shuffle_playlists()
-        self.update_playlist_display()
 
     def sort_playlist_menu(self):
         self.sort_menu_window = tk.Toplevel()
@@ -297,32 +461,30 @@ class MusicPlayer:
 
     def sort_playlists(self, key):
         self.playlists.sort_playlists_by(key)
-        self.update_playlist_display()
         self.sort_menu_window.destroy()
 
-    def update_playlist_display(self):
-        self.playlist_box.delete(0, tk.END)
-        current = self.playlists.head
-        while current:
-            self.playlist_box.insert(tk.END, current.name)
-            current = current.next
-
     def toggle_pause(self):
         if self.paused:
             mixer.music.unpause()
             self.paused = False
             self.status_var.set("Resumed")
+            self.playback.playing()
         else:
             mixer.music.pause()
             self.paused = True
             self.status_var.set("Paused")
+            self.playback.idle()
 
     def next_song(self):
         if not self.playlists.current_playlist:
             return
         songs = self.playlists.current_playlist.songs
-        if songs.current and songs.current.next:
-            songs.current = songs.current.next
+        if self.upcoming and self.upcoming_songs is songs:
+            next_node = self.upcoming
+        else:
+            next_node = self.pick_next(songs)
+        if next_node:
+            songs.current = next_node
             self.play_song()
             self.update_song_selection()
 
@@ -330,33 +492,45 @@ class MusicPlayer:
         if not self.playlists.current_playlist:
             return
         songs = self.playlists.current_playlist.songs
-        if songs.current and songs.current.prev:
-            songs.current = songs.current.prev
+        prev_node = self.song_view().node_before(songs.current) if songs.current else None
+        if prev_node:
+            songs.current = prev_node
             self.play_song()
             self.update_song_selection()
 
+    def toggle_shuffle_play(self):
+        self.reset_shuffle_order()
+        # The song lined up (and maybe queued) was picked in the old order
+        songs = self.upcoming_songs
+        if songs is not None and songs.current:
+            self.prepare_next(songs)
+
+    def reset_shuffle_order(self):
+        # Draws a random order lazily instead of reordering the playlist
+        if self.shuffle_play.get() and self.playlists.current_playlist:
+            self.shuffle_order = self.playlists.current_playlist.songs.shuffle_order()
+        else:
+            self.shuffle_order = None
+
     def update_song_selection(self):
         self.song_box.selection_clear(0, tk.END)
-        current_node = self.playlists.current_playlist.songs.current
-        index = 0
-        node = self.playlists.current_playlist.songs.head
-        while node != current_node:
-            node = node.next
-            index += 1
+        songs = self.playlists.current_playlist.songs
+        index = self.song_view().index_of(songs.current)
         self.song_box.selection_set(index)
         self.song_box.see(index)
 
     def shuffle_songs(self):
         if self.playlists.current_playlist:
             self.playlists.current_playlist.songs.shuffle()
-            self.update_song_display()
+            self.playlists.save_order(self.playlists.current_playlist)
+            self.set_song_order("Playlist order")
 
     def sort_song_menu(self):
         sort_window = tk.Toplevel(self.root)
         sort_window.title("Sort Songs")
 
-        options = ["Title", "Artist", "Play Count"]
-        var = tk.StringVar(value=options[0])
+        options = ["Playlist order", *self.SONG_ORDERS]
+        var = tk.StringVar(value=self.song_order)
 
         tk.Label(sort_window, text="Sort by:").pack()
         for option in options:
@@ -366,15 +540,17 @@ class MusicPlayer:
         confirm_btn.pack()
 
     def sort_songs(self, key, window):
-        key_map = {
-            "Title": "title",
-            "Artist": "artist",
-            "Play Count": "play_count"
-        }
+        # Switches to a sorted view; the playlist keeps its own order
+        self.set_song_order(key)
+        window.destroy()
+
+    def set_song_order(self, order):
+        self.song_order = order
+        self.store.set_setting("song_order", order)
         if self.playlists.current_playlist:
-            self.playlists.current_playlist.songs.sort_by(key_map[key])
             self.update_song_display()
-        window.destroy()
+            if self.playlists.current_playlist.songs.current:
+                self.update_song_selection()
 
     def create_volume_control(self):
         volume_frame = tk.Frame(self.root)
@@ -390,13 +566,42 @@ class MusicPlayer:
         self.status_label.pack(side=tk.BOTTOM, fill=tk.X)
 
     def set_volume(self, volume):
-        mixer.music.set_volume(int(volume)/100)
-
-    def check_music_end(self):
-        for event in mixer.event.get():
-            if event.type == self.SONG_END_EVENT:
-                self.next_song()
-        self.root.after(100, self.check_music_end)
+        self.volume = int(volume)/100
+        self.apply_volume()
+
+    def apply_volume(self):
+        """Slider volume corrected by the playing song's measured gain"""
+        gain = self.loudness.gain(self.playing_path) if self.playing_path else 1.0
+        mixer.music.set_volume(min(1.0, self.volume * gain))
+
+    def queue_upcoming(self, path):
+        """Called once the next track is in memory"""
+        upcoming = self.upcoming
+        if upcoming and upcoming.path == path and not self.queued and self.prefetcher.ready(path):
+            # Queued in pygame, the next track starts without a gap or a disk read
+            # Replaces any song queued before the order changed
+            mixer.music.queue(self.prefetcher.take(path), namehint(path))
+            self.queued = True
+            self.queue_pending = True
+
+    def track_ended(self):
+        pending = self.queue_pending
+        self.queue_pending = False
+        if self.queued:
+            songs = self.upcoming_songs
+            songs.current = self.upcoming
+            self.song_started(songs)
+            current = self.playlists.current_playlist
+            if current and current.songs is songs:
+                self.update_song_selection()
+        else:
+            if pending:
+                # pygame went on to a song queued before the order changed;
+                # stop it and load the one lined up now, if any
+                mixer.music.stop()
+            self.next_song()
+        if not mixer.music.get_busy():
+            self.playback.idle()
 
 if __name__ == "__main__":
     root = tk.Tk()
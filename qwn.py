@@ -1,62 +1,21 @@
-import os
-import random
+import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from pygame import mixer, USEREVENT
 from collections import deque
-
-# Node class for doubly linked list
-class SongNode:
-    def __init__(self, title, artist, path):
-        self.title = title
-        self.artist = artist
-        self.path = path
-        self.play_count = 0
-        self.prev = None
-        self.next = None
-
-# Doubly linked list implementation
-class Playlist:
-    def __init__(self):
-        self.head = None
-        self.tail = None
-        self.current = None
-        self.size = 0
-
-    def add_song(self, title, artist, path):
-        new_node = SongNode(title, artist, path)
-        if not self.head:
-            self.head = self.tail = new_node
-        else:
-            new_node.prev = self.tail
-            self.tail.next = new_node
-            self.tail = new_node
-        self.size += 1
-
-    def to_list(self):
-        songs = []
-        current = self.head
-        while current:
-            songs.append(current)
-            current = current.next
-        return songs
-
-    def from_list(self, songs):
-        self.head = None
-        self.tail = None
-        self.size = 0
-        for song in songs:
-            self.add_song(song.title, song.artist, song.path)
-
-    def shuffle(self):
-        songs = self.to_list()
-        random.shuffle(songs)
-        self.from_list(songs)
-
-    def sort_by(self, key):
-        songs = self.to_list()
-        songs.sort(key=lambda x: getattr(x, key))
-        self.from_list(songs)
+from dsafy.dedupe import DuplicateFinder, HashCache, duplicate_songs, extra_copies
+from dsafy.history import PlaylistHistory
+from dsafy.lazy import LazyModule
+from dsafy.loudness import LoudnessAnalyzer, LoudnessCache
+from dsafy.playback import PlaybackController
+from dsafy.playlist import Playlist
+from dsafy.prefetch import Prefetcher, namehint
+from dsafy.scanner import LibraryScanner
+from dsafy.tags import TagCache, TagReader
+from dsafy.virtual_list import VirtualList
+
+# pygame is imported when the player starts its mixer, not with this module
+pygame = LazyModule("pygame")
+mixer = LazyModule("pygame.mixer")
 
 # Music Player Application
 class MusicPlayer:
@@ -64,14 +23,34 @@ class MusicPlayer:
         self.root = root
         self.root.title("Python Music Player")
         self.playlist = Playlist()
+        # Earlier orders of the playlist, for Undo and Redo
+        self.history = PlaylistHistory(self.playlist)
+        # Order the songs are shown and stepped through in: the playlist or one of its sorted views
+        self.view = self.playlist
         self.paused = False
+        self.shuffle_order = None
+        self.scanner = None
+        self.tag_reader = TagReader(TagCache())
+        self.duplicate_finder = DuplicateFinder(HashCache())
+        self.prefetcher = Prefetcher()
+        # Measures tracks in the background so each plays at the same loudness
+        self.loudness = LoudnessAnalyzer(LoudnessCache())
+        self.volume = 0.5
+        # Song lined up after the current one, and whether pygame has it queued
+        self.upcoming = None
+        self.queued = False
+        # Whether pygame holds a queued file at all; after the order changes
+        # it can be one lined up before, which pygame cannot take back
+        self.queue_pending = False
 
         # Initialize Pygame mixer
         mixer.init()
 
         # Set up custom event for song end
-        self.SONG_END_EVENT = USEREVENT + 1
+        self.SONG_END_EVENT = pygame.USEREVENT + 1
         mixer.music.set_endevent(self.SONG_END_EVENT)
+        # Polls for track ends from the Tk loop while playing; nothing runs while idle
+        self.playback = PlaybackController(self.root, self.SONG_END_EVENT, self.track_ended)
 
         # Create GUI elements
         self.create_menu()
@@ -84,13 +63,23 @@ class MusicPlayer:
         menubar = tk.Menu(self.root)
         file_menu = tk.Menu(menubar, tearoff=0)
         file_menu.add_command(label="Add Songs", command=self.add_songs)
+        file_menu.add_command(label="Stop Adding", command=self.cancel_scan)
+        file_menu.add_command(label="Remove Duplicates", command=self.remove_duplicates)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
         menubar.add_cascade(label="File", menu=file_menu)
+        edit_menu = tk.Menu(menubar, tearoff=0)
+        edit_menu.add_command(label="Undo", accelerator="Ctrl+Z", command=self.undo)
+        edit_menu.add_command(label="Redo", accelerator="Ctrl+Y", command=self.redo)
+        menubar.add_cascade(label="Edit", menu=edit_menu)
         self.root.config(menu=menubar)
+        self.root.bind("<Control-z>", self.undo)
+        self.root.bind("<Control-y>", self.redo)
 
     def create_playlist_box(self):
-        self.playlist_box = tk.Listbox(self.root, bg="black", fg="white", width=50, height=15)
+        # Only the visible rows are built, however long the playlist gets
+        self.playlist_box = VirtualList(self.root, self.playlist, bg="black", fg="white",
+                                        width=50, height=15)
         self.playlist_box.pack(pady=10)
         self.playlist_box.bind('<<ListboxSelect>>', self.on_song_select)
 
@@ -104,6 +93,9 @@ class MusicPlayer:
         next_btn = tk.Button(control_frame, text=">>", command=self.next_song)
         shuffle_btn = tk.Button(control_frame, text="Shuffle", command=self.shuffle_playlist)
         sort_btn = tk.Button(control_frame, text="Sort", command=self.sort_menu)
+        self.shuffle_play = tk.BooleanVar(value=False)
+        shuffle_play_btn = tk.Checkbutton(control_frame, text="Shuffle Play", variable=self.shuffle_play,
+                                          command=self.toggle_shuffle_play)
 
         prev_btn.grid(row=0, column=0, padx=10)
         play_btn.grid(row=0, column=1, padx=10)
@@ -111,6 +103,7 @@ class MusicPlayer:
         next_btn.grid(row=0, column=3, padx=10)
         shuffle_btn.grid(row=0, column=4, padx=10)
         sort_btn.grid(row=0, column=5, padx=10)
+        shuffle_play_btn.grid(row=0, column=6, padx=10)
 
     def create_volume_control(self):
         volume_frame = tk.Frame(self.root)
@@ -130,66 +123,175 @@ class MusicPlayer:
         if not directory:
             return
 
-        valid_extensions = ['.mp3', '.wav', '.ogg']
-        for root_dir, _, files in os.walk(directory):
-            for file in files:
-                if any(file.endswith(ext) for ext in valid_extensions):
-                    path = os.path.join(root_dir, file)
-                    title = os.path.splitext(file)[0]
-                    artist = "Unknown"  # Implement proper metadata reading if needed
-                    self.playlist.add_song(title, artist, path)
-                    self.playlist_box.insert(tk.END, title)
+        # Scan on worker threads and pick up the results from the Tk loop
+        self.cancel_scan()
+        self.scanner = LibraryScanner([directory], tag_reader=self.tag_reader).start()
+        self.root.after(100, self.poll_scanner)
+
+    def poll_scanner(self):
+        if not self.scanner:
+            return
+        # Read progress first: once done is seen, every batch is queued
+        progress = self.scanner.progress()
+        for batch in self.scanner.drain():
+            self.playlist.add_songs(batch)
+            self.loudness.analyse(song.path for song in batch)
+
+        if progress.done:
+            self.status_var.set(f"Added {progress.files} songs in {progress.elapsed:.1f}s")
+            self.scanner = None
+        else:
+            self.status_var.set(f"Scanning... {progress.files} songs ({progress.rate:.0f} files/s)")
+            self.root.after(100, self.poll_scanner)
+
+    def cancel_scan(self):
+        if self.scanner:
+            self.scanner.cancel()
 
     def play_song(self, index=None):
         if not self.playlist.size:
             return
 
         if index is not None:
-            # Find the node corresponding to the selected index
-            current = self.playlist.head
-            for _ in range(index):
-                current = current.next
-            self.playlist.current = current
+            self.playlist.current = self.view.node_at(index)
         elif not self.playlist.current:
-            self.playlist.current = self.playlist.head
+            self.playlist.current = self.view.node_at(0)
 
-        mixer.music.load(self.playlist.current.path)
+        path = self.playlist.current.path
+        data = self.prefetcher.take(path)
+        if data:
+            mixer.music.load(data, namehint(path))
+        else:
+            mixer.music.load(path)
+        # Loading drops whatever pygame had queued
+        self.queue_pending = False
         mixer.music.play()
+        self.playback.playing()
+        self.song_started()
+
+    def song_started(self):
         self.playlist.current.play_count += 1
+        self.playlist.touch(self.playlist.current)
         self.status_var.set(f"Now Playing: {self.playlist.current.title}")
         self.paused = False
+        self.apply_volume()
+        self.prepare_next()
+
+    def pick_next(self):
+        if self.shuffle_order:
+            return next(self.shuffle_order, None)
+        return self.view.node_after(self.playlist.current) if self.playlist.current else None
+
+    def prepare_next(self):
+        """Choose the following song now and start reading it into memory"""
+        self.queued = False
+        self.upcoming = self.pick_next()
+        if self.upcoming:
+            self.prefetcher.fetch(self.upcoming.path,
+                                  lambda path: self.playback.call_soon(self.queue_upcoming, path))
 
     def toggle_pause(self):
         if self.paused:
             mixer.music.unpause()
             self.paused = False
             self.status_var.set("Resumed")
+            self.playback.playing()
         else:
             mixer.music.pause()
             self.paused = True
             self.status_var.set("Paused")
+            self.playback.idle()
 
     def next_song(self):
-        if self.playlist.current and self.playlist.current.next:
-            self.playlist.current = self.playlist.current.next
+        next_node = self.upcoming or self.pick_next()
+        if next_node:
+            self.playlist.current = next_node
             self.play_song()
             self.update_playlist_selection()
 
     def prev_song(self):
-        if self.playlist.current and self.playlist.current.prev:
-            self.playlist.current = self.playlist.current.prev
+        prev_node = self.view.node_before(self.playlist.current) if self.playlist.current else None
+        if prev_node:
+            self.playlist.current = prev_node
             self.play_song()
             self.update_playlist_selection()
 
+    def toggle_shuffle_play(self):
+        self.reset_shuffle_order()
+        if self.playlist.current:
+            self.prepare_next()
+
+    def reset_shuffle_order(self):
+        # Draws a random order lazily instead of reordering the playlist
+        if self.shuffle_play.get():
+            self.shuffle_order = self.playlist.shuffle_order()
+        else:
+            self.shuffle_order = None
+
+    def remove_duplicates(self):
+        """Drop songs added twice or whose audio is already in the playlist"""
+        entries = [(self.playlist, node) for node in self.playlist]
+        self.status_var.set(f"Looking for duplicates among {len(entries)} songs...")
+        # Reading and hashing the files runs on a worker thread
+        threading.Thread(target=self._find_duplicates, args=(entries,), name="dedupe", daemon=True).start()
+
+    def _find_duplicates(self, entries):
+        groups = duplicate_songs(entries, self.duplicate_finder)
+        self.playback.call_soon(self.drop_duplicates, groups)
+
+    def drop_duplicates(self, groups):
+        current = self.playlist.current
+        removed = 0
+        # Undone in one step, not one per song
+        with self.history.batch():
+            for _, node in extra_copies(groups):
+                if node not in self.playlist:
+                    # Removed since the duplicates were found
+                    continue
+                if node is self.playlist.current:
+                    self.playlist.current = None
+                self.playlist.remove_node(node)
+                removed += 1
+        self.status_var.set(f"Removed {removed} duplicate songs")
+        self.check_upcoming(current)
+
+    def check_upcoming(self, current):
+        """Line up the next song again if current (as it was) or the one after it was taken out"""
+        if current not in self.playlist or (self.upcoming and self.upcoming not in self.playlist):
+            self.upcoming = None
+            self.queued = False
+            self.prepare_next()
+
     def shuffle_playlist(self):
         self.playlist.shuffle()
-        self.update_playlist_display()
+        self.show_order(self.playlist)
+
+    def undo(self, event=None):
+        if self.history.undo():
+            self.order_restored()
+        else:
+            self.status_var.set("Nothing to undo")
+
+    def redo(self, event=None):
+        if self.history.redo():
+            self.order_restored()
+        else:
+            self.status_var.set("Nothing to redo")
+
+    def order_restored(self):
+        # Songs may have come back or gone and the order changed, so the
+        # shuffle order and the song lined up next are drawn again
+        self.reset_shuffle_order()
+        self.upcoming = None
+        self.queued = False
+        self.prepare_next()
+        self.show_order(self.playlist)
 
     def sort_menu(self):
         sort_window = tk.Toplevel(self.root)
         sort_window.title("Sort Options")
 
-        options = ["Title", "Artist", "Play Count"]
+        options = ["Playlist order", "Title", "Artist", "Play Count"]
         var = tk.StringVar(value=options[0])
 
         tk.Label(sort_window, text="Sort by:").pack()
@@ -201,29 +303,27 @@ class MusicPlayer:
 
     def sort_playlist(self, key, window):
         key_map = {
-            "Title": "title",
-            "Artist": "artist",
-            "Play Count": "play_count"
+            "Title": ("title",),
+            "Artist": ("artist", "title"),
+            "Play Count": ("play_count",)
         }
-        self.playlist.sort_by(key_map[key])
-        self.update_playlist_display()
+        # Sorted views are kept up to date, so switching back and forth does not re-sort
+        if key in key_map:
+            self.show_order(self.playlist.sorted_view(*key_map[key]))
+        else:
+            self.show_order(self.playlist)
         window.destroy()
 
-    def update_playlist_display(self):
-        self.playlist_box.delete(0, tk.END)
-        current = self.playlist.head
-        while current:
-            self.playlist_box.insert(tk.END, current.title)
-            current = current.next
+    def show_order(self, view):
+        self.view = view
+        self.playlist_box.set_model(view)
+        if self.playlist.current and not self.shuffle_order:
+            self.prepare_next()
+            self.update_playlist_selection()
 
     def update_playlist_selection(self):
         self.playlist_box.selection_clear(0, tk.END)
-        current_node = self.playlist.current
-        index = 0
-        node = self.playlist.head
-        while node != current_node:
-            node = node.next
-            index += 1
+        index = self.view.index_of(self.playlist.current)
         self.playlist_box.selection_set(index)
         self.playlist_box.see(index)
 
@@ -236,16 +336,41 @@ class MusicPlayer:
             self.play_song(index)
 
     def set_volume(self, volume):
-        mixer.music.set_volume(int(volume)/100)
-
-    def check_music_end(self):
-        for event in mixer.event.get():
-            if event.type == self.SONG_END_EVENT:
-                self.next_song()
-        self.root.after(100, self.check_music_end)
+        self.volume = int(volume)/100
+        self.apply_volume()
+
+    def apply_volume(self):
+        """Slider volume corrected by the current song's measured gain"""
+        gain = self.loudness.gain(self.playlist.current.path) if self.playlist.current else 1.0
+        mixer.music.set_volume(min(1.0, self.volume * gain))
+
+    def queue_upcoming(self, path):
+        """Called once the next track is in memory"""
+        upcoming = self.upcoming
+        if upcoming and upcoming.path == path and not self.queued and self.prefetcher.ready(path):
+            # Queued in pygame, the next track starts without a gap or a disk read
+            # Replaces any song queued before the order changed
+            mixer.music.queue(self.prefetcher.take(path), namehint(path))
+            self.queued = True
+            self.queue_pending = True
+
+    def track_ended(self):
+        pending = self.queue_pending
+        self.queue_pending = False
+        if self.queued:
+            self.playlist.current = self.upcoming
+            self.song_started()
+            self.update_playlist_selection()
+        else:
+            if pending:
+                # pygame went on to a song queued before the order changed;
+                # stop it and load the one lined up now, if any
+                mixer.music.stop()
+            self.next_song()
+        if not mixer.music.get_busy():
+            self.playback.idle()
 
 if __name__ == "__main__":
     root = tk.Tk()
     player = MusicPlayer(root)
-    root.after(100, player.check_music_end)
     root.mainloop()
\ No newline at end of file
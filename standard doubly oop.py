@@ -1,4 +1,5 @@
 class Node():
+    __slots__ = ("data", "next_node", "prev_node")
     def __init__(self,d,n=None,p=None):
         self.data = d
         self.next_node = n
@@ -0,0 +1,28 @@
+import os
+import unittest
+
+from dsafy.playlist_io import ImportReport, read_m3u
+
+
+class ReadM3uTest(unittest.TestCase):
+    def test_length_too_large_is_skipped(self):
+        lines = [
+            "#EXTM3U",
+            "#EXTINF:inf,Artist - Endless",
+            "endless.mp3",
+            "#EXTINF:1e400,Artist - Huge",
+            "huge.mp3",
+            "#EXTINF:215,Artist - Song",
+            "song.mp3",
+        ]
+        report = ImportReport()
+        entries = list(read_m3u(lines, os.sep + "music", report))
+
+        self.assertEqual([entry.title for entry in entries], ["endless", "huge", "Song"])
+        self.assertEqual([entry.duration for entry in entries], [0, 0, 215])
+        self.assertEqual(report.entries, 3)
+        self.assertEqual(report.skipped, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()